@@ -9,7 +9,7 @@ class Biome:
                 max_height_difference: int,
                 blocks_by_zone: list[tuple[blocks.Block, int, int]],
                 ore_veins_qty: tuple[int, int],
-                ore_veins_repartition: list[tuple[float, blocks.Block, int, int, float]],
+                ore_veins_repartition: list[tuple[float, blocks.Block, int, int, float, float]],
                 tree: Tree|None = None
                 ) -> None:
 
@@ -21,7 +21,7 @@ class Biome:
         self.blocks_by_zone = blocks_by_zone
         # (min_qty, max_qty)
         self.ore_veins_qty = ore_veins_qty
-        # (probability, block, min_height, max_height, probability_to_expand)
+        # (probability, block, min_height, max_height, probability_to_expand, probability_to_expand of the generation version 1)
         self.ore_veins_repartition = ore_veins_repartition
         self.tree = tree
 
@@ -43,8 +43,8 @@ PLAIN = Biome(
     ],
     ore_veins_qty=(2, 10),
     ore_veins_repartition=[
-        (0.6, blocks.COAL, 20, 50, 0.4),
-        (0.4, blocks.IRON, 16, 47, 0.3)
+        (0.6, blocks.COAL, 20, 50, 0.47, 0.4),
+        (0.4, blocks.IRON, 16, 47, 0.33, 0.3)
     ],
     tree = Tree(trunk_block=blocks.WOOD,
                 leave_block=blocks.LEAVES,
@@ -72,8 +72,8 @@ HILL = Biome(
     ],
     ore_veins_qty=(4, 10),
     ore_veins_repartition=[
-        (0.6, blocks.COAL, 30, 60, 0.4),
-        (0.4, blocks.IRON, 25, 57, 0.3)
+        (0.6, blocks.COAL, 30, 60, 0.47, 0.4),
+        (0.4, blocks.IRON, 25, 57, 0.33, 0.3)
     ],
     tree = Tree(trunk_block=blocks.WOOD,
                 leave_block=blocks.LEAVES,
@@ -98,8 +98,8 @@ MOUNTAIN = Biome(
     blocks_by_zone=[],
     ore_veins_qty=(10, 20),
     ore_veins_repartition=[
-        (0.6, blocks.COAL, 30, 80, 0.4),
-        (0.4, blocks.IRON, 20, 65, 0.3)
+        (0.6, blocks.COAL, 30, 80, 0.47, 0.4),
+        (0.4, blocks.IRON, 20, 65, 0.33, 0.3)
     ]
 )
 
@@ -111,8 +111,8 @@ HIGH_MOUNTAIN = Biome(
     blocks_by_zone=[(blocks.SNOW, 100, 10)],
     ore_veins_qty=(10, 20),
     ore_veins_repartition=[
-        (0.6, blocks.COAL, 30, 102, 0.4),
-        (0.4, blocks.IRON, 40, 80, 0.3)
+        (0.6, blocks.COAL, 30, 102, 0.47, 0.4),
+        (0.4, blocks.IRON, 40, 80, 0.33, 0.3)
     ]
 )
 
@@ -124,8 +124,8 @@ LAKE = Biome(
     blocks_by_zone=[],
     ore_veins_qty=(1, 3),
     ore_veins_repartition=[
-        (0.7, blocks.COAL, 15, 22, 0.2),
-        (0.3, blocks.IRON, 5, 10, 0.1)
+        (0.7, blocks.COAL, 15, 22, 0.21, 0.2),
+        (0.3, blocks.IRON, 5, 10, 0.1, 0.1)
     ]
 )
 
@@ -0,0 +1,78 @@
+from collections import OrderedDict
+from map_chunk import Chunk
+
+class ChunkCache:
+    def __init__(self, max_nb_chunks: int = 64, max_size: int|None = None) -> None:
+        """
+        Recently unloaded chunks, kept in memory in case they come back in a chunk manager's window.
+        max_nb_chunks: maximum number of cached chunks
+        max_size: maximum number of bytes used by the cached chunks' blocks, or None for no limit
+        The least recently used chunks are evicted first.
+        The cached chunks are packed (see Chunk.pack), and unpacked when taken back from the cache.
+        """
+        self.max_nb_chunks: int = max_nb_chunks
+        self.max_size: int|None = max_size
+        self._chunks: OrderedDict[int, Chunk] = OrderedDict()
+        self._size: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def __contains__(self, id: int) -> bool:
+        return id in self._chunks
+
+    def get_size(self) -> int:
+        return self._size
+
+    def get_chunks(self) -> list[Chunk]:
+        return list(self._chunks.values())
+
+    def get(self, id: int) -> Chunk|None:
+        """Return the chunk without removing it from the cache nor counting a hit or a miss"""
+        return self._chunks.get(id, None)
+
+    def pop(self, id: int) -> Chunk|None:
+        """Remove the chunk from the cache and return it, or None if it isn't cached"""
+        chunk = self._chunks.pop(id, None)
+        if chunk is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._size -= chunk.get_size()
+        chunk.unpack()
+        return chunk
+
+    def put(self, chunk: Chunk) -> list[Chunk]:
+        """
+        Add the chunk to the cache.
+        Return the evicted chunks, which must be saved by the caller.
+        """
+        chunk.pack()
+        self._chunks[chunk.id] = chunk
+        self._size += chunk.get_size()
+        evicted: list[Chunk] = []
+        while len(self._chunks) > self.max_nb_chunks or (self.max_size is not None and self._size > self.max_size and self._chunks):
+            _, evicted_chunk = self._chunks.popitem(last=False)
+            self._size -= evicted_chunk.get_size()
+            self.evictions += 1
+            evicted.append(evicted_chunk)
+        return evicted
+
+    def clear(self) -> list[Chunk]:
+        """Empty the cache and return the chunks it contained"""
+        chunks = list(self._chunks.values())
+        self._chunks.clear()
+        self._size = 0
+        return chunks
+
+    def get_stats(self) -> dict[str, int]:
+        return {
+            'nb_chunks': len(self._chunks),
+            'size': self._size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
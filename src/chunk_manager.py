@@ -1,100 +1,106 @@
 import blocks
 import pygame
 from math import ceil
-from map_generation import MapGenerator
+from chunk_store import ChunkStore
 from map_chunk import Chunk
-from save_manager_interface import SaveManagerInterface
-from typing import cast
 
 class ChunkManager:
-    def __init__(self, nb_chunks_by_side: int, chunk_x_position: int, window: pygame.Surface, map_generator: MapGenerator, save_manager: SaveManagerInterface) -> None:
+    def __init__(self, nb_chunks_by_side: int, chunk_x_position: int, window: pygame.Surface, chunk_store: ChunkStore) -> None:
+        """
+        Window of chunks around a position.
+        The chunks themselves are owned by the chunk store, shared with the other chunk managers.
+        The chunks of the window are indexed by their id.
+        """
         self.nb_chunks_by_side: int = 0
         self.chunk_x_position: int = chunk_x_position
         self.window: pygame.Surface = window
-        self.map_generator: MapGenerator = map_generator
-        self.save_manager: SaveManagerInterface = save_manager
-        central_chunk = save_manager.load_chunk(chunk_x_position)
-        if central_chunk is None:
-            central_chunk = self.map_generator.generate_chunk(False, chunk_x_position)
-            self.save_manager.save_chunk(central_chunk)
-        self.chunks: list[Chunk] = [central_chunk]
+        self.chunk_store: ChunkStore = chunk_store
+        self.chunks: dict[int, Chunk] = {chunk_x_position: self.chunk_store.acquire_chunk(chunk_x_position, False)}
         self.change_nb_chunks(nb_chunks_by_side)
-    
+
     def get_chunk_and_coordinates(self, x: int, y: int) -> tuple[Chunk|None, int, int]:
         if y < 0 or y >= Chunk.HEIGHT: return None, -1, -1
         x += Chunk.LENGTH // 2
-        x -= self.chunk_x_position * Chunk.LENGTH
-        nb_chunk: int = x // Chunk.LENGTH + self.nb_chunks_by_side
-        if nb_chunk < 0 or nb_chunk >= len(self.chunks): return None, -1, -1 # out of loaded chunks
-        chunk = self.chunks[nb_chunk]
+        chunk = self.chunks.get(x // Chunk.LENGTH, None)
+        if chunk is None: return None, -1, -1 # out of loaded chunks
         return chunk, x % Chunk.LENGTH, y
 
     def get_block(self, x: int, y: int) -> blocks.Block|None:
         """Return the value at given coordinates, or blocks.NOTHING if out of map"""
         chunk, x, y = self.get_chunk_and_coordinates(x, y)
         if chunk is None: return blocks.NOTHING
-        return chunk.blocks[y][x]
+        return chunk.get_block(x, y)
+
+    def is_traversable(self, x: int, y: int, out_of_map: bool = False) -> bool:
+        """Same as get_block(x, y) in blocks.TRAVERSABLE_BLOCKS (see Chunk.is_traversable), returning out_of_map if out of map"""
+        chunk, x, y = self.get_chunk_and_coordinates(x, y)
+        if chunk is None: return out_of_map
+        return chunk.is_traversable(x, y)
 
     def replace_block(self, x: int, y: int, block: blocks.Block) -> bool:
         chunk, x, y = self.get_chunk_and_coordinates(x, y)
         if chunk is None: return False
-        chunk.blocks[y][x] = block
+        self.chunk_store.set_block(chunk, x, y, block)
         return True
-    
+
     def update(self, x: int) -> None:
-        x += Chunk.LENGTH // 2
-        x -= self.chunk_x_position * Chunk.LENGTH
-        if x < 0:
-            self.change_chunks(-1)
-        elif x >= Chunk.LENGTH:
-            self.change_chunks(1)
+        chunk_id = (x + Chunk.LENGTH // 2) // Chunk.LENGTH
+        if abs(chunk_id - self.chunk_x_position) == 1:
+            self.change_chunks(chunk_id - self.chunk_x_position)
+        elif chunk_id != self.chunk_x_position:
+            self.recenter(chunk_id)
+
+    def prefetch(self, added_x: int, nb_chunks: int) -> None:
+        """Ask the chunk store to prepare the nb_chunks next chunks after the window, on the side given by added_x"""
+        for i in range(1, nb_chunks + 1):
+            if added_x > 0:
+                self.chunk_store.prefetch_chunk(self.chunk_x_position + self.nb_chunks_by_side + i, True)
+            else:
+                self.chunk_store.prefetch_chunk(self.chunk_x_position - self.nb_chunks_by_side - i, False)
 
     def change_chunks(self, added_x: int) -> None:
+        """Move the window by one chunk (added_x is 1 or -1)"""
         if added_x == 1:
-            self.save_manager.save_chunk(self.chunks.pop(0))
+            self.chunk_store.release_chunk(self.chunks.pop(self.chunk_x_position - self.nb_chunks_by_side).id)
             id = self.chunk_x_position + self.nb_chunks_by_side + 1
-            chunk = self.save_manager.load_chunk(id)
-            if chunk is None:
-                chunk = self.map_generator.generate_chunk(True, id)
-            self.chunks.append(chunk)
+            self.chunks[id] = self.chunk_store.acquire_chunk(id, True)
         else:
-            self.save_manager.save_chunk(self.chunks.pop(-1))
+            self.chunk_store.release_chunk(self.chunks.pop(self.chunk_x_position + self.nb_chunks_by_side).id)
             id = self.chunk_x_position - self.nb_chunks_by_side - 1
-            chunk = self.save_manager.load_chunk(id)
-            if chunk is None:
-                chunk = self.map_generator.generate_chunk(False, id)
-            self.chunks.insert(0, chunk)
+            self.chunks[id] = self.chunk_store.acquire_chunk(id, False)
         self.chunk_x_position += added_x
 
+    def _move_window(self, chunk_x_position: int, nb_chunks_by_side: int) -> None:
+        """
+        Change the window, only releasing and acquiring the chunks which are in one of the windows but not in the other.
+        The new chunks are acquired from the nearest to the farthest of the previous position,
+        so they are generated in order.
+        """
+        old_ids = set(self.chunks)
+        new_ids = set(range(chunk_x_position - nb_chunks_by_side, chunk_x_position + nb_chunks_by_side + 1))
+        for id in old_ids - new_ids:
+            self.chunk_store.release_chunk(self.chunks.pop(id).id)
+        added_ids = sorted(new_ids - old_ids, key=lambda id: (abs(id - self.chunk_x_position), id))
+        added_chunks = self.chunk_store.acquire_chunks([(id, id > self.chunk_x_position) for id in added_ids])
+        self.chunks.update(zip(added_ids, added_chunks))
+        self.chunk_x_position = chunk_x_position
+        self.nb_chunks_by_side = nb_chunks_by_side
+
+    def recenter(self, chunk_id: int) -> None:
+        """Move the window to be centered on the given chunk, for example after a teleportation"""
+        if chunk_id == self.chunk_x_position: return
+        self._move_window(chunk_id, self.nb_chunks_by_side)
+
     def change_nb_chunks(self, new_nb_chunks: int) -> None:
         if new_nb_chunks == self.nb_chunks_by_side: return
-        new_chunks: list[Chunk|None] = [None for _ in range(new_nb_chunks * 2 + 1)]
-        difference = new_nb_chunks - self.nb_chunks_by_side
-        if difference > 0:
-            for i in range(self.nb_chunks_by_side*2 + 1):
-                new_chunks[difference + i] = self.chunks[i]
-            for i in range(difference):
-                chunk = self.save_manager.load_chunk(self.chunk_x_position - self.nb_chunks_by_side - i - 1)
-                if chunk is None:
-                    chunk = self.map_generator.generate_chunk(False, self.chunk_x_position - self.nb_chunks_by_side - i - 1)
-                    self.save_manager.save_chunk(chunk)
-                new_chunks[difference - i - 1] = chunk
-                chunk = self.save_manager.load_chunk(self.chunk_x_position + self.nb_chunks_by_side + i + 1)
-                if chunk is None:
-                    chunk = self.map_generator.generate_chunk(True, self.chunk_x_position + self.nb_chunks_by_side + i + 1)
-                    self.save_manager.save_chunk(chunk)
-                new_chunks[difference + self.nb_chunks_by_side*2 + 1 + i] = chunk
-        else:
-            for i in range(new_nb_chunks, self.nb_chunks_by_side):
-                self.save_manager.save_chunk(self.chunks[self.nb_chunks_by_side - i - 1])
-                self.save_manager.save_chunk(self.chunks[self.nb_chunks_by_side + i + 1])
-            for i in range(new_nb_chunks*2 + 1):
-                new_chunks[i] = self.chunks[self.nb_chunks_by_side - new_nb_chunks + i]
-        
-        self.chunks = cast(list[Chunk], new_chunks)
-        self.nb_chunks_by_side = new_nb_chunks
-    
+        self._move_window(self.chunk_x_position, new_nb_chunks)
+
     def display_chunks(self, x: int, y: int) -> None:
+        """
+        Draw the blocks around the given position, over the air's image, in a single blits call.
+        The blocks of the sections made of a single block (see Chunk.compact) aren't looked up one by one,
+        and only the air's image is drawn for the sections full of air.
+        """
         window_size = self.window.get_size()
         nb_blocks_length = ceil(window_size[0] / blocks.Block.BLOCK_SIZE + 2)
         nb_blocks_height = ceil(window_size[1] / blocks.Block.BLOCK_SIZE + 2)
@@ -103,19 +109,36 @@ class ChunkManager:
         max_x = min(x + nb_blocks_length // 2, (self.chunk_x_position + self.nb_chunks_by_side) * Chunk.LENGTH + Chunk.LENGTH // 2)
         min_y = max(0, y - nb_blocks_height // 2)
         max_y = min(Chunk.HEIGHT, y + nb_blocks_height // 2)
-        for i in range(min_x, max_x):
-            for j in range(min_y, max_y):
-                self.display_block(i, j, -x, -y)
-    
-    def display_block(self, x: int, y: int, x_add: int, y_add: int) -> None:
-        block_x = x + Chunk.LENGTH // 2 - self.chunk_x_position * Chunk.LENGTH
-        chunk = self.chunks[block_x // Chunk.LENGTH + self.nb_chunks_by_side]
-        window_size = self.window.get_size()
-        coords = window_size[0] // 2 + blocks.Block.BLOCK_SIZE*(x + x_add - 0.5), window_size[1] // 2 - blocks.Block.BLOCK_SIZE*(y + 1 + y_add)
-        self.window.blits(
-            ((blocks.AIR.image, coords), (chunk.blocks[y][block_x % Chunk.LENGTH].image, coords))
-        )
+        origin_x = window_size[0] // 2 - blocks.Block.BLOCK_SIZE * (x + 0.5)
+        origin_y = window_size[1] // 2 + blocks.Block.BLOCK_SIZE * (y - 1)
+        air_image = blocks.AIR.image
+        images: list[tuple[pygame.Surface, tuple[float, float]]] = []
+        start_x = min_x
+        while start_x < max_x:
+            chunk_id = (start_x + Chunk.LENGTH // 2) // Chunk.LENGTH
+            chunk = self.chunks[chunk_id]
+            # first x of the next chunk
+            end_x = min(max_x, (chunk_id + 1) * Chunk.LENGTH - Chunk.LENGTH // 2)
+            for section_y in range(min_y - min_y % Chunk.SECTION_HEIGHT, max_y, Chunk.SECTION_HEIGHT):
+                lines = range(max(min_y, section_y), min(max_y, section_y + Chunk.SECTION_HEIGHT))
+                section_block = chunk.get_section_block(section_y)
+                for i in range(start_x, end_x):
+                    coords_x = origin_x + blocks.Block.BLOCK_SIZE * i
+                    if section_block is blocks.AIR:
+                        images.extend((air_image, (coords_x, origin_y - blocks.Block.BLOCK_SIZE * j)) for j in lines)
+                        continue
+                    chunk_x = (i + Chunk.LENGTH // 2) % Chunk.LENGTH
+                    for j in lines:
+                        coords = coords_x, origin_y - blocks.Block.BLOCK_SIZE * j
+                        block = chunk.get_block(chunk_x, j) if section_block is None else section_block
+                        images.append((air_image, coords))
+                        if block is not blocks.AIR:
+                            images.append((block.image, coords))
+            start_x = end_x
+        self.window.blits(images, False)
 
-    def save(self) -> None:
-        for chunk in self.chunks:
-            self.save_manager.save_chunk(chunk)
\ No newline at end of file
+    def unload(self) -> None:
+        """Give back every chunk to the chunk store"""
+        for chunk in self.chunks.values():
+            self.chunk_store.release_chunk(chunk.id)
+        self.chunks = {}
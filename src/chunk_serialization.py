@@ -0,0 +1,147 @@
+import json
+import struct
+import zlib
+from typing import Any
+from biomes import BIOMES, get_biome_environment_values
+from map_chunk import Chunk
+from map_generation import MapGenerator
+from palette import PalettedBlocks
+
+MAGIC = b'TGCH'
+# 2: the DELTA data starts with the generation version
+FORMAT_VERSION = 2
+
+# encodings of the blocks ids
+RAW = 0
+ZLIB = 1
+PALETTE = 2
+# generation state of the chunk (see MapGenerator.get_state) and the blocks which differ from the generated ones,
+# falling back to ZLIB if the chunk can't be generated again or if the differences are bigger than the raw blocks
+DELTA = 3
+
+# magic, format version, id, direction, biome (height, temperature, humidity), is_forest, encoding, data length
+HEADER = struct.Struct('<4sBqb3bbBI')
+# version of the generation (see MapGenerator.GENERATION_VERSION), generation state length,
+# then the values of the state as a json list, in the order of GENERATION_STATE_KEYS
+DELTA_GENERATION_VERSION = struct.Struct('<H')
+DELTA_STATE_LENGTH = struct.Struct('<H')
+GENERATION_STATE_KEYS = ('seed', 'is_last_biome_forest', 'last_biome', 'biome_height_value', 'last_block_height_value',
+                         'temperature_value', 'humidity_value', 'last_caves_pos_and_sizes')
+# crc32 of the generated blocks, to detect when the generator doesn't generate the same chunk anymore
+DELTA_CHECKSUM = struct.Struct('<I')
+# index and id of a block which differs from the generated one
+DELTA_CELL = struct.Struct('<HB')
+
+
+def chunk_to_bytes(chunk: Chunk, encoding: int = ZLIB, random_access_seed: str|None = None) -> bytes:
+    """
+    random_access_seed: seed of the world if it uses the random access generation,
+    so a chunk without generation state (like a chunk loaded with another encoding) can still be encoded with DELTA
+    """
+    blocks_ids = bytes(chunk.get_blocks_ids())
+    if encoding == RAW:
+        data = blocks_ids
+    elif encoding == ZLIB:
+        data = zlib.compress(blocks_ids)
+    elif encoding == PALETTE:
+        paletted_blocks = PalettedBlocks(blocks_ids)
+        data = bytes((len(paletted_blocks.palette),)) + paletted_blocks.palette + bytes((paletted_blocks.bits,)) + paletted_blocks.data
+    elif encoding == DELTA:
+        data = get_delta_data(chunk, blocks_ids, random_access_seed)
+        if data is None:
+            encoding = ZLIB
+            data = zlib.compress(blocks_ids)
+    else:
+        raise ValueError(f'Unknown chunk encoding: {encoding}')
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, chunk.id, chunk.direction, *get_biome_environment_values(chunk.biome), chunk.is_forest, encoding, len(data))
+    return header + data
+
+
+def get_encoding(data: bytes|memoryview) -> int:
+    """Return the encoding of the chunk's data, without decoding it"""
+    magic, *_, encoding, _ = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError('Not a chunk')
+    return encoding
+
+
+def get_delta_data(chunk: Chunk, blocks_ids: bytes, random_access_seed: str|None = None) -> bytes|None:
+    """
+    Return the data of the DELTA encoding, or None if the chunk can't be generated again or if it changed too much.
+    A chunk without generation state is generated again from random_access_seed if it is given,
+    with each generation version, as the one which generated the chunk isn't known, keeping the smallest data.
+    """
+    if chunk.generation_state is not None:
+        return get_state_delta_data(chunk, blocks_ids, chunk.generation_state)
+    if random_access_seed is None: return None
+    best_data = None
+    for version in range(MapGenerator.GENERATION_VERSION, 0, -1):
+        data = get_state_delta_data(chunk, blocks_ids, {'seed': random_access_seed, 'generation_version': version})
+        if data is not None and (best_data is None or len(data) < len(best_data)):
+            best_data = data
+    return best_data
+
+
+def get_state_delta_data(chunk: Chunk, blocks_ids: bytes, state: dict[str, Any]) -> bytes|None:
+    """Return the data of the DELTA encoding from the given generation state, or None if the chunk differs too much from the generated one"""
+    generated_blocks_ids = bytes(MapGenerator.generate_chunk_from_state(state, chunk.direction, chunk.id).get_blocks_ids())
+    cells = [DELTA_CELL.pack(i, id) for i, (id, generated_id) in enumerate(zip(blocks_ids, generated_blocks_ids)) if id != generated_id]
+    if len(cells) * DELTA_CELL.size > len(blocks_ids): return None
+    # the state of the random access generation only has the seed
+    state_data = json.dumps([state[key] for key in GENERATION_STATE_KEYS if key in state], separators=(',', ':')).encode()
+    generation_version = DELTA_GENERATION_VERSION.pack(state.get('generation_version', 1))
+    return generation_version + DELTA_STATE_LENGTH.pack(len(state_data)) + state_data + DELTA_CHECKSUM.pack(zlib.crc32(generated_blocks_ids)) + b''.join(cells)
+
+
+def delta_data_to_chunk(data: bytes|memoryview, id: int, direction: bool, format_version: int) -> Chunk:
+    """Raise a ValueError if the chunk isn't generated anymore as it was when it was saved, instead of applying its differences to other blocks"""
+    offset = 0
+    # the chunks saved before the generation versions were generated by the first one
+    generation_version = 1
+    if format_version >= 2:
+        generation_version, = DELTA_GENERATION_VERSION.unpack_from(data)
+        offset += DELTA_GENERATION_VERSION.size
+    state_length, = DELTA_STATE_LENGTH.unpack_from(data, offset)
+    offset += DELTA_STATE_LENGTH.size
+    state = dict(zip(GENERATION_STATE_KEYS, json.loads(bytes(data[offset:offset + state_length]))))
+    state['generation_version'] = generation_version
+    offset += state_length
+    checksum, = DELTA_CHECKSUM.unpack_from(data, offset)
+    offset += DELTA_CHECKSUM.size
+    chunk = MapGenerator.generate_chunk_from_state(state, direction, id)
+    blocks_ids = chunk.get_blocks_ids()
+    if zlib.crc32(blocks_ids) != checksum:
+        raise ValueError(f'Chunk {id} is not generated as when it was saved (generation version {generation_version})')
+    for i, block_id in DELTA_CELL.iter_unpack(data[offset:]):
+        blocks_ids[i] = block_id
+    chunk.set_blocks_ids(blocks_ids)
+    return chunk
+
+
+def bytes_to_chunk(data: bytes|memoryview) -> Chunk:
+    """Raise a ValueError if the data isn't a chunk, or if a DELTA chunk isn't generated anymore as it was when it was saved"""
+    magic, version, id, direction, height, temperature, humidity, is_forest, encoding, length = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError('Not a chunk')
+    # handle different format versions
+    blocks_data = data[HEADER.size:HEADER.size + length]
+    if encoding == RAW:
+        # a read-only memoryview (of a mapped file) isn't copied, see Chunk
+        blocks_ids = blocks_data if type(blocks_data) is memoryview and blocks_data.readonly else bytearray(blocks_data)
+    elif encoding == ZLIB:
+        blocks_ids = bytearray(zlib.decompress(blocks_data))
+    elif encoding == PALETTE:
+        palette_size = blocks_data[0]
+        palette = blocks_data[1:1 + palette_size]
+        bits = blocks_data[1 + palette_size]
+        blocks_ids = PalettedBlocks.from_data(palette, bits, Chunk.LENGTH * Chunk.HEIGHT, blocks_data[2 + palette_size:]).get_ids()
+    elif encoding == DELTA:
+        chunk = delta_data_to_chunk(blocks_data, id, bool(direction), version)
+        chunk.is_modified = False
+        chunk.is_forest = bool(is_forest)
+        return chunk
+    else:
+        raise ValueError(f'Unknown chunk encoding: {encoding}')
+    chunk = Chunk(id, bool(direction), BIOMES[(height, temperature, humidity)], blocks_ids)
+    chunk.is_forest = bool(is_forest)
+    return chunk
@@ -0,0 +1,211 @@
+import threading
+from queue import Queue
+from time import monotonic
+import blocks
+from chunk_cache import ChunkCache
+from map_chunk import Chunk
+from map_generation import MapGenerator
+from save_manager_interface import SaveManagerInterface
+
+class ChunkStore:
+    def __init__(self, map_generator: MapGenerator, save_manager: SaveManagerInterface, cache_nb_chunks: int = 64, cache_max_size: int|None = None, prefetch: bool = True) -> None:
+        """
+        Chunks loaded in the world, shared by every chunk manager (the player's and the entities' ones).
+        Each chunk counts the chunk managers using it, and stays loaded while at least one of them needs it.
+        Unused chunks are kept in a cache (see ChunkCache) and only saved when evicted from it.
+        Only the chunks modified since they were loaded or last saved are written, so newly generated chunks are written together.
+        If prefetch is True, a worker thread loads or generates in advance the chunks asked with prefetch_chunk, and puts them in the cache.
+        The worker loads and generates them without the store's lock, so the main thread only waits for it when it needs the chunk being prefetched.
+        """
+        self.map_generator: MapGenerator = map_generator
+        self.save_manager: SaveManagerInterface = save_manager
+        self.chunks: dict[int, Chunk] = {}
+        self._nb_viewers: dict[int, int] = {}
+        self.cache: ChunkCache = ChunkCache(cache_nb_chunks, cache_max_size)
+        # the chunks and the cache are shared with the prefetch worker
+        self._lock: threading.Lock = threading.Lock()
+        # the map generator's state changes with each generated chunk, so the chunks are generated one at a time
+        self._generation_lock: threading.Lock = threading.Lock()
+        # notified when the worker puts a chunk in the cache
+        self._prefetched_condition: threading.Condition = threading.Condition(self._lock)
+        # chunks being loaded or generated by the worker
+        self._prefetching_ids: set[int] = set()
+        self._prefetch_queue: Queue[tuple[int, bool]|None] = Queue()
+        self._prefetch_pending: set[int] = set()
+        # number of chunks loaded or generated in advance by the worker
+        self.nb_prefetched: int = 0
+        # number of chunks loaded or generated by acquire_chunk, because they weren't prefetched
+        self.nb_sync_loads: int = 0
+        self._prefetch_worker: threading.Thread|None = None
+        # modified chunks which will be saved by the next calls to autosave
+        self._autosave_ids: list[int] = []
+        if prefetch:
+            self._prefetch_worker = threading.Thread(target=self._prefetch_loop, daemon=True)
+            self._prefetch_worker.start()
+
+    def _generate_chunk(self, id: int, direction: bool) -> Chunk:
+        with self._generation_lock:
+            return self.map_generator.generate_chunk(direction, id)
+
+    def _load_or_generate_chunk(self, id: int, direction: bool) -> Chunk:
+        chunk = self.save_manager.load_chunk(id)
+        if chunk is None:
+            chunk = self._generate_chunk(id, direction)
+        return chunk
+
+    def _wait_prefetching(self, ids: list[int]) -> None:
+        """Wait for the worker to put in the cache the given chunks it is loading or generating. Must be called with the lock acquired."""
+        while any(id in self._prefetching_ids for id in ids):
+            self._prefetched_condition.wait()
+
+    def acquire_chunk(self, id: int, direction: bool) -> Chunk:
+        """
+        Return the chunk with the given id, loading or generating it if it isn't already loaded.
+        Every call must be followed by a call to release_chunk once the chunk isn't needed anymore.
+        """
+        with self._lock:
+            self._wait_prefetching([id])
+            chunk = self.chunks.get(id, None)
+            if chunk is None:
+                chunk = self.cache.pop(id)
+                if chunk is None:
+                    chunk = self._load_or_generate_chunk(id, direction)
+                    self.nb_sync_loads += 1
+                self.chunks[id] = chunk
+                self._nb_viewers[id] = 0
+            self._nb_viewers[id] += 1
+        return chunk
+
+    def acquire_chunks(self, ids_and_directions: list[tuple[int, bool]]) -> list[Chunk]:
+        """
+        Same as acquire_chunk for several chunks, loading the saved ones at once (see SaveManagerInterface.load_chunks).
+        The chunks which aren't saved are generated in the given order.
+        """
+        acquired_chunks: list[Chunk] = []
+        with self._lock:
+            self._wait_prefetching([id for id, _ in ids_and_directions])
+            missing_ids = [id for id, _ in ids_and_directions if id not in self.chunks and id not in self.cache]
+            loaded_chunks = self.save_manager.load_chunks(missing_ids)
+            for id, direction in ids_and_directions:
+                chunk = self.chunks.get(id, None)
+                if chunk is None:
+                    chunk = self.cache.pop(id)
+                    if chunk is None:
+                        chunk = loaded_chunks.get(id, None)
+                        if chunk is None:
+                            chunk = self._generate_chunk(id, direction)
+                        self.nb_sync_loads += 1
+                    self.chunks[id] = chunk
+                    self._nb_viewers[id] = 0
+                self._nb_viewers[id] += 1
+                acquired_chunks.append(chunk)
+        return acquired_chunks
+
+    def release_chunk(self, id: int) -> None:
+        """Move the chunk to the cache if nothing uses it anymore"""
+        with self._lock:
+            self._nb_viewers[id] -= 1
+            if self._nb_viewers[id] == 0:
+                self._nb_viewers.pop(id)
+                self._save_chunks(self.cache.put(self.chunks.pop(id)))
+
+    def prefetch_chunk(self, id: int, direction: bool) -> None:
+        """
+        Ask the worker to load or generate the chunk, if it isn't already available.
+        Chunks must be asked in the order they would be generated.
+        """
+        if self._prefetch_worker is None: return
+        # don't wait for the worker, the chunk will be asked again on the next frame
+        if not self._lock.acquire(blocking=False): return
+        try:
+            if id in self._prefetch_pending or id in self._prefetching_ids or id in self.chunks or id in self.cache: return
+            self._prefetch_pending.add(id)
+        finally:
+            self._lock.release()
+        self._prefetch_queue.put((id, direction))
+
+    def _prefetch_loop(self) -> None:
+        while True:
+            item = self._prefetch_queue.get()
+            if item is None: return
+            id, direction = item
+            with self._lock:
+                self._prefetch_pending.discard(id)
+                if id in self.chunks or id in self.cache: continue
+                self._prefetching_ids.add(id)
+            chunk = None
+            try:
+                # without the lock, only the generation waits for the chunks generated by the main thread
+                chunk = self._load_or_generate_chunk(id, direction)
+            finally:
+                with self._lock:
+                    self._prefetching_ids.discard(id)
+                    if chunk is not None:
+                        self.nb_prefetched += 1
+                        self._save_chunks(self.cache.put(chunk))
+                    self._prefetched_condition.notify_all()
+
+    def stop_prefetching(self) -> None:
+        """Wait for the already asked chunks to be prefetched and stop the worker"""
+        if self._prefetch_worker is None: return
+        self._prefetch_queue.put(None)
+        self._prefetch_worker.join()
+        self._prefetch_worker = None
+
+    def set_block(self, chunk: Chunk, x: int, y: int, block: blocks.Block) -> None:
+        """
+        Set a block of a loaded chunk.
+        If the chunk was saved, the edit is recorded in the save's journal instead of saving the whole chunk again,
+        until the chunk has too many edits in the journal.
+        """
+        chunk.set_block(x, y, block)
+        chunk.compact(y)
+        if chunk.is_saved:
+            if self.save_manager.record_edit(chunk.id, x, y, blocks.BLOCKS_DICT[block]):
+                chunk.is_modified = True
+        else:
+            chunk.is_modified = True
+
+    def _save_chunks(self, chunks: list[Chunk]) -> None:
+        for chunk in chunks:
+            if not chunk.is_modified: continue
+            self.save_manager.save_chunk(chunk)
+            chunk.is_modified = False
+            chunk.is_saved = True
+
+    def save_chunks(self, chunks: list[Chunk]) -> None:
+        """Save the given chunks, skipping the ones which didn't change since they were last saved"""
+        with self._lock:
+            self._save_chunks(chunks)
+
+    def start_autosave(self) -> None:
+        """Plan the save of every modified chunk, done little by little by autosave"""
+        with self._lock:
+            self._autosave_ids = [id for id, chunk in self.chunks.items() if chunk.is_modified]
+            self._autosave_ids += [chunk.id for chunk in self.cache.get_chunks() if chunk.is_modified]
+
+    def autosave(self, time_budget: float) -> None:
+        """Save the chunks planned by start_autosave, until time_budget seconds have elapsed"""
+        if not self._autosave_ids: return
+        end_time = monotonic() + time_budget
+        # don't wait for the worker, the autosave will continue on the next frame
+        if not self._lock.acquire(blocking=False): return
+        try:
+            while self._autosave_ids and monotonic() < end_time:
+                id = self._autosave_ids.pop()
+                chunk = self.chunks.get(id, None)
+                if chunk is None:
+                    chunk = self.cache.get(id)
+                if chunk is not None:
+                    self._save_chunks([chunk])
+        finally:
+            self._lock.release()
+
+    def save(self) -> None:
+        """Save the loaded and the cached chunks at once, and wait for them to be on the disk"""
+        with self._lock:
+            chunks = [chunk for chunk in list(self.chunks.values()) + self.cache.get_chunks() if chunk.is_modified]
+            self.save_manager.save_chunks(chunks)
+            for chunk in chunks:
+                chunk.is_modified = False
+                chunk.is_saved = True
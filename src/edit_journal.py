@@ -0,0 +1,108 @@
+import os
+import struct
+
+# type, chunk id, value
+RECORD = struct.Struct('<BqI')
+# value: x | y << 8 | block id << 16
+EDIT = 0
+# value: number of edits of the chunk, from the oldest one, which are in the chunk's file
+CHECKPOINT = 1
+
+
+class EditJournal:
+    def __init__(self, path: str, max_dead_records: int = 4096) -> None:
+        """
+        Append-only file of the blocks set in the saved chunks since the chunks were last written.
+        Setting a block only appends a small record, and the edits are replayed on the chunk when it is loaded.
+        Once a chunk is written, a checkpoint record marks its previous edits as useless.
+        The file is rewritten without the useless records when it is opened,
+        and when there are more than max_dead_records of them and more of them than useful ones.
+        Each edit has a sequence number, only kept in memory, to know which edits were made after a chunk was copied to be written.
+        """
+        self.path: str = path
+        self.max_dead_records: int = max_dead_records
+        # chunk id -> edits (sequence number, x, y, block id)
+        self.edits: dict[int, list[tuple[int, int, int, int]]] = {}
+        self._seq: int = 0
+        self._nb_edits: int = 0
+        self._nb_dead_records: int = 0
+        if self._read():
+            self._open()
+        else:
+            self._rewrite()
+
+    def _read(self) -> bool:
+        """Return whether the file only contains useful records, and doesn't need to be rewritten"""
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return False
+        # the last record could be incomplete if the game crashed while writing it
+        is_complete = len(data) % RECORD.size == 0
+        data = data[:len(data) - len(data) % RECORD.size]
+        for type, id, value in RECORD.iter_unpack(data):
+            if type == EDIT:
+                self.edits.setdefault(id, []).append((self._seq, value & 0xff, (value >> 8) & 0xff, value >> 16))
+                self._seq += 1
+                self._nb_edits += 1
+            elif type == CHECKPOINT:
+                edits = self.edits.get(id, [])
+                nb_checkpointed_edits = min(value, len(edits))
+                del edits[:nb_checkpointed_edits]
+                self._nb_edits -= nb_checkpointed_edits
+                if not edits:
+                    self.edits.pop(id, None)
+        return is_complete and self._nb_edits == len(data) // RECORD.size
+
+    def _open(self) -> None:
+        # not buffered, so an edit is in the file as soon as it is appended
+        self.file = open(self.path, 'ab', buffering=0)
+
+    def _rewrite(self) -> None:
+        """Rewrite the file with only the edits which aren't in the chunks' files"""
+        edits = sorted((edit[0], id, edit[1:]) for id, chunk_edits in self.edits.items() for edit in chunk_edits)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(b''.join(RECORD.pack(EDIT, id, x | y << 8 | block_id << 16) for _, id, (x, y, block_id) in edits))
+        os.replace(tmp_path, self.path)
+        self._nb_dead_records = 0
+        self._open()
+
+    def get_seq(self) -> int:
+        """Return the sequence number of the next edit"""
+        return self._seq
+
+    def append(self, id: int, x: int, y: int, block_id: int) -> int:
+        """Append the edit and return the number of edits of the chunk which aren't in its file"""
+        self.file.write(RECORD.pack(EDIT, id, x | y << 8 | block_id << 16))
+        edits = self.edits.setdefault(id, [])
+        edits.append((self._seq, x, y, block_id))
+        self._seq += 1
+        self._nb_edits += 1
+        return len(edits)
+
+    def get_edits(self, id: int, start_seq: int = 0) -> list[tuple[int, int, int]]:
+        """Return the edits (x, y, block id) of the chunk, from the one with the given sequence number"""
+        return [edit[1:] for edit in self.edits.get(id, ()) if edit[0] >= start_seq]
+
+    def checkpoint(self, id: int, seq: int) -> None:
+        """Forget the edits of the chunk older than seq, which are now in the chunk's file"""
+        edits = self.edits.get(id, None)
+        if not edits: return
+        nb_checkpointed_edits = 0
+        while nb_checkpointed_edits < len(edits) and edits[nb_checkpointed_edits][0] < seq:
+            nb_checkpointed_edits += 1
+        if not nb_checkpointed_edits: return
+        del edits[:nb_checkpointed_edits]
+        if not edits:
+            self.edits.pop(id)
+        self._nb_edits -= nb_checkpointed_edits
+        self._nb_dead_records += nb_checkpointed_edits + 1
+        self.file.write(RECORD.pack(CHECKPOINT, id, nb_checkpointed_edits))
+        if self._nb_dead_records > self.max_dead_records and self._nb_dead_records > self._nb_edits:
+            self.file.close()
+            self._rewrite()
+
+    def close(self) -> None:
+        self.file.close()
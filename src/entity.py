@@ -2,21 +2,20 @@ from load_image import load_image
 import pygame
 import blocks
 from chunk_manager import ChunkManager
+from chunk_store import ChunkStore
 from entity_interface import EntityInterface
 from map_chunk import Chunk
-from map_generation import MapGenerator
-from save_manager_interface import SaveManagerInterface
 from gui.ui_manager import UIManager
 
 ENTITIES_IMAGES_PATH: str = 'src/resources/images'
 class Entity(EntityInterface):
-    def __init__(self, name: str, x: int, y: int, speed_x: int, speed_y: int, direction: bool, ui_manager: UIManager, image_length: int, image_height: int, map_generator: MapGenerator, save_manager: SaveManagerInterface, add_path: str='', collisions: bool=True) -> None:
+    def __init__(self, name: str, x: int, y: int, speed_x: int, speed_y: int, direction: bool, ui_manager: UIManager, image_length: int, image_height: int, chunk_store: ChunkStore, add_path: str='', collisions: bool=True) -> None:
         """
         Base class for entities.
         They can move, and have collisions or not.
         If no chunk manager is given, collisions are disabled, because we can't check if they collide with blocks.
         """
-        self.chunk_manager: ChunkManager = ChunkManager(1, round(x / Chunk.LENGTH), ui_manager.get_window(), map_generator, save_manager)
+        self.chunk_manager: ChunkManager = ChunkManager(1, round(x / Chunk.LENGTH), ui_manager.get_window(), chunk_store)
         self.collisions = collisions
         self.name: str = name
         self.x: int = x
@@ -76,8 +75,7 @@ class Entity(EntityInterface):
                 is_valid_pos = True
                 if self.collisions:
                     for x in range(-(self.entity_size[0] // 2), self.entity_size[0] // 2 + 1):
-                        block = self.chunk_manager.get_block(self.x + x, self.y + self.top_player_pos)
-                        if block is not blocks.NOTHING and block not in blocks.TRAVERSABLE_BLOCKS:
+                        if not self.chunk_manager.is_traversable(self.x + x, self.y + self.top_player_pos, True):
                             is_valid_pos = False
                             break
                         block = self.chunk_manager.get_block(self.x + x, self.y + 1)
@@ -96,8 +94,7 @@ class Entity(EntityInterface):
             is_valid_pos = True
             if self.collisions:
                 for x in range(-(self.entity_size[0] // 2), self.entity_size[0] // 2 + 1):
-                    block = self.chunk_manager.get_block(self.x + x, self.y - 1)
-                    if block is not blocks.NOTHING and block not in blocks.TRAVERSABLE_BLOCKS:
+                    if not self.chunk_manager.is_traversable(self.x + x, self.y - 1, True):
                         is_valid_pos = False
                         break
             if is_valid_pos:
@@ -114,15 +111,15 @@ class Entity(EntityInterface):
                 is_valid_pos = True
                 if self.collisions:
                     for y in range(1, self.entity_size[1]):
-                        if self.chunk_manager.get_block(self.x + (self.entity_size[0] // 2 + 1) * sign, self.y + y) not in blocks.TRAVERSABLE_BLOCKS:
+                        if not self.chunk_manager.is_traversable(self.x + (self.entity_size[0] // 2 + 1) * sign, self.y + y):
                             is_valid_pos = False
                             break
                 if is_valid_pos:
                     if self.collisions:
                         # check if need to jump up to the next block
-                        if self.chunk_manager.get_block(self.x + (self.entity_size[0] // 2 + 1) * sign, self.y) not in blocks.TRAVERSABLE_BLOCKS:
-                            if self.chunk_manager.get_block(self.x + (self.entity_size[0] // 2 + 1) * sign, self.y + self.entity_size[1]) in blocks.TRAVERSABLE_BLOCKS \
-                                    and self.chunk_manager.get_block(self.x + (self.entity_size[0] // 2) * sign, self.y + self.entity_size[1]) in blocks.TRAVERSABLE_BLOCKS:
+                        if not self.chunk_manager.is_traversable(self.x + (self.entity_size[0] // 2 + 1) * sign, self.y):
+                            if self.chunk_manager.is_traversable(self.x + (self.entity_size[0] // 2 + 1) * sign, self.y + self.entity_size[1]) \
+                                    and self.chunk_manager.is_traversable(self.x + (self.entity_size[0] // 2) * sign, self.y + self.entity_size[1]):
                                 self.y += 1
                             else:
                                 continue
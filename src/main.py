@@ -13,7 +13,11 @@ window = pygame.display.set_mode((WIDTH, HEIGHT), pygame.RESIZABLE)
 from player import Player
 from map_generation import MapGenerator
 from chunk_manager import Chunk
+from chunk_store import ChunkStore
 from save_manager import SaveManager
+from save_backends import get_save_manager, NEW_SAVES_BACKEND
+from save_catalog import update_save_metadata
+from world_backup import start_snapshot, remove_old_snapshots
 from entity import Entity
 from blocks_menus.block_menu import BlockMenu
 from gui.ui_manager import UIManager
@@ -21,11 +25,15 @@ from typing import Any
 from module_infos import SRC_PATH
 
 from time import monotonic
+import logging
 import menus
 import blocks
 import random
 import items
 
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
 class Game:
     def __init__(self, window: pygame.Surface) -> None:
         self.FPS: int = 20
@@ -62,7 +70,7 @@ class Game:
             self.pressed_keys[key] = False
         self.run()
 
-    def game_loop(self, map_generator: MapGenerator, save_manager: SaveManager, player: Player) -> int:
+    def game_loop(self, map_generator: MapGenerator, save_manager: SaveManager, chunk_store: ChunkStore, player: Player) -> int:
         # reload theme on each game
         self._ui_manager.update_theme(os.path.join(SRC_PATH, 'resources', 'gui_themes', 'inventory.json'))
         exit_code = menus.EXIT
@@ -70,12 +78,18 @@ class Game:
         pygame.key.set_repeat(100, 100)
         last_time_toggled_menu = 0
         min_time_before_toggling_menu = 0.5
+        last_autosave = monotonic()
+        autosave_period = 60 # seconds
+        autosave_time_by_frame = 0.005 # seconds
+        last_backup = monotonic()
+        backup_period = 600 # seconds
+        max_backups = 10
+        backup_thread = None
         loop = True
         need_update: bool = True
         entities: list[Entity] = []
         for i in range(10):
-            entities.append(Entity('stone', i, Chunk.HEIGHT, 0, 0, False, self._ui_manager, 1, 1, map_generator, save_manager, 'persos', True))
-        blocks_to_update: list[tuple[int, int, blocks.Block]] = []
+            entities.append(Entity('stone', i, Chunk.HEIGHT, 0, 0, False, self._ui_manager, 1, 1, chunk_store, 'persos', True))
         blocks_data: dict[tuple[int, int], dict[str, Any]] = {}
         menu_opened: BlockMenu|type[BlockMenu]|None = None
         block_interacting: tuple[int, int]|None = None
@@ -83,10 +97,6 @@ class Game:
             time_last_update: float = clock.get_rawtime()
             if need_update:
                 if menu_opened is None:
-                    for entity in entities:
-                        for block in blocks_to_update:
-                            entity.chunk_manager.replace_block(*block)
-                    blocks_to_update.clear()
                     self._ui_manager.get_window().fill("#000000")
                     player.chunk_manager.display_chunks(player.x, player.y)
                     player.display()
@@ -176,14 +186,10 @@ class Game:
                 updates = player.place_block(pygame.mouse.get_pos())
                 if updates is not None:
                     need_update = True
-                    if 'changed_block' in updates:
-                        blocks_to_update.append(updates['changed_block'])
             if self.pressed_keys['remove_block']:
                 updates = player.remove_block(pygame.mouse.get_pos())
                 if updates is not None:
                     need_update = True
-                    if 'changed_block' in updates:
-                        blocks_to_update.append(updates['changed_block'])
             if self.pressed_keys['interact']:
                 if last_time_toggled_menu + min_time_before_toggling_menu < monotonic():
                     if menu_opened is not None:
@@ -217,12 +223,38 @@ class Game:
                 need_update = menu_opened.update() or need_update
             else:
                 need_update = self._ui_manager.update() or need_update
+            if last_autosave + autosave_period < monotonic():
+                chunk_store.start_autosave()
+                save_manager.save_players([player])
+                last_autosave = monotonic()
+            chunk_store.autosave(autosave_time_by_frame)
+            if last_backup + backup_period < monotonic() and (backup_thread is None or not backup_thread.is_alive()):
+                # the backup reads the saved chunks in a thread, without stopping the game
+                backup_thread = start_snapshot(save_manager)
+                last_backup = monotonic()
             clock.tick(self.FPS)
+        for entity in entities:
+            entity.chunk_manager.unload()
+        chunk_store.stop_prefetching()
+        logger.info('Chunks: %d prefetched, %d loaded or generated while the game waited', chunk_store.nb_prefetched, chunk_store.nb_sync_loads)
+        logger.info('Chunk cache: %(hits)d hits, %(misses)d misses, %(evictions)d evictions, %(nb_chunks)d chunks (%(size)d bytes) left', chunk_store.cache.get_stats())
         player.save()
         save_manager.save_players([player])
         save_manager.save_generation_infos(map_generator.get_infos_to_save())
+        nb_chunks = len(save_manager.get_chunk_ids())
+        if backup_thread is not None:
+            backup_thread.join()
+            remove_old_snapshots(save_manager.save_name, max_backups)
+        save_manager.close()
+        update_save_metadata(save_manager.save_name, map_generator.seed, nb_chunks)
         return exit_code
 
+    def create_player(self, chunk_store: ChunkStore) -> Player:
+        player = Player('base_character', 0, Chunk.HEIGHT, 0, 0, False, self._ui_manager, chunk_store)
+        player.hot_bar_inventory.add_element(items.WORKBENCH, 5)
+        player.hot_bar_inventory.add_element(items.FURNACE, 5)
+        return player
+
     def run(self) -> None:
         self._ui_manager = UIManager(self.window)
         while True:
@@ -240,12 +272,11 @@ class Game:
                 seed = create_world_menu.seed_text_box.get_text()
                 if not seed:
                     seed = None
-                map_generator = MapGenerator(seed)
-                save_manager = SaveManager(save_name)
+                map_generator = MapGenerator(seed, random_access=True)
+                save_manager = get_save_manager(save_name, NEW_SAVES_BACKEND)
                 map_generator.create_seeds()
-                player = Player('base_character', 0, Chunk.HEIGHT, 0, 0, False, self._ui_manager, map_generator, save_manager)
-                player.hot_bar_inventory.add_element(items.WORKBENCH, 5)
-                player.hot_bar_inventory.add_element(items.FURNACE, 5)
+                chunk_store = ChunkStore(map_generator, save_manager)
+                player = self.create_player(chunk_store)
             elif exit_code == menus.LOAD_SAVE:
                 load_save_menu = menus.LoadSaveMenu(self.window)
                 exit_code = load_save_menu.run()
@@ -253,10 +284,11 @@ class Game:
                     break
                 elif exit_code == menus.BACK:
                     continue
-                save_manager = SaveManager(load_save_menu.saves_list.child_selected.get_text())
+                save_manager = get_save_manager(load_save_menu.saves_list.child_selected.get_text())
                 generation_infos = save_manager.load_generation_infos()
                 map_generator = MapGenerator()
                 map_generator.set_infos(generation_infos)
+                chunk_store = ChunkStore(map_generator, save_manager)
                 players_dict = save_manager.load_players()
                 players = []
                 for player, values in players_dict.items():
@@ -268,15 +300,15 @@ class Game:
                         values['speed_y'],
                         values['direction'],
                         self._ui_manager,
-                        map_generator,
-                        save_manager,
+                        chunk_store,
                         values['main_inventory'],
                         values['hot_bar_inventory']
                         )
                     )
-                player = players[0]
+                # saves pregenerated by world_tool have no player
+                player = players[0] if players else self.create_player(chunk_store)
             if exit_code == menus.START_GAME:
-                exit_code = self.game_loop(map_generator, save_manager, player)
+                exit_code = self.game_loop(map_generator, save_manager, chunk_store, player)
                 if exit_code == menus.EXIT:
                     break
                 elif exit_code == menus.TO_MAIN_MENU:
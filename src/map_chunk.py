@@ -1,31 +1,204 @@
 import blocks
 from biomes import Biome
+from typing import Any
+from palette import PalettedBlocks
+
+# translation table from a block id to 1 if the block isn't traversable, else 0
+NOT_TRAVERSABLE_IDS_TABLE: bytes = bytes(int(blocks.REVERSED_BLOCKS_DICT.get(id, None) not in blocks.TRAVERSABLE_BLOCKS) for id in range(256))
+# translation table replacing the ids of the non traversable blocks by the air's one
+CARVED_IDS_TABLE: bytes = bytes(blocks.BLOCKS_DICT[blocks.AIR] if NOT_TRAVERSABLE_IDS_TABLE[id] else id for id in range(256))
 
 class Chunk:
     LENGTH: int = 32
     HEIGHT: int = 128
-    def __init__(self, id: int, direction: bool, biome: Biome) -> None:
-        """direction: False -> left, True -> right"""
+    SECTION_HEIGHT: int = 32
+    def __init__(self, id: int, direction: bool, biome: Biome, blocks_ids: bytearray|memoryview|None = None) -> None:
+        """
+        direction: False -> left, True -> right
+        blocks_ids: flat array of ids (see blocks.BLOCKS_DICT), line by line from the bottom, or None for a chunk full of air.
+        If blocks_ids is read-only (like a memoryview of a mapped file), the sections are slices of it and are only copied when a block is set.
+
+        The chunk is split in vertical sections of SECTION_HEIGHT lines.
+        A section made of a single block is only stored as the id of this block,
+        the other ones as a flat array of ids.
+        The chunk can also be packed (see pack), to use less memory while it isn't used.
+        The height of the highest non traversable block of each column is kept up to date (see get_height).
+        """
         self.id: int = id
         self.direction: bool = direction
         self.biome: Biome = biome
         self.is_forest: bool = False
-        self.blocks: list[list[blocks.Block]] = []
-    
-    def __repr__(self) -> str:
-        return f'id: {self.id}, direction: {self.direction}, biome: {self.biome.name}, is_forest: {self.is_forest}'
+        # whether the chunk changed since it was last saved
+        self.is_modified: bool = False
+        # whether the chunk was saved, so its edits can be recorded in the save's journal
+        self.is_saved: bool = False
+        # state of the map generator before generating the chunk, to generate it again (see MapGenerator.get_state)
+        self.generation_state: dict[str, Any]|None = None
+        self.sections: list[bytearray|memoryview|int] = [blocks.BLOCKS_DICT[blocks.AIR]] * (self.HEIGHT // self.SECTION_HEIGHT)
+        self.packed_blocks: PalettedBlocks|None = None
+        self.heights: list[int] = [0] * self.LENGTH
+        if blocks_ids is not None:
+            self.set_blocks_ids(blocks_ids)
+
+    def get_block(self, x: int, y: int) -> blocks.Block:
+        if self.packed_blocks is not None:
+            return blocks.REVERSED_BLOCKS_DICT[self.packed_blocks.get(x + y * self.LENGTH)]
+        section = self.sections[y // self.SECTION_HEIGHT]
+        if type(section) is int:
+            return blocks.REVERSED_BLOCKS_DICT[section]
+        return blocks.REVERSED_BLOCKS_DICT[section[x + y % self.SECTION_HEIGHT * self.LENGTH]]
+
+    def is_traversable(self, x: int, y: int) -> bool:
+        """Same as get_block(x, y) in blocks.TRAVERSABLE_BLOCKS, but answered from the id of the section if it's made of a single block"""
+        if self.packed_blocks is not None:
+            return not NOT_TRAVERSABLE_IDS_TABLE[self.packed_blocks.get(x + y * self.LENGTH)]
+        section = self.sections[y // self.SECTION_HEIGHT]
+        if type(section) is int:
+            return not NOT_TRAVERSABLE_IDS_TABLE[section]
+        return not NOT_TRAVERSABLE_IDS_TABLE[section[x + y % self.SECTION_HEIGHT * self.LENGTH]]
+
+    def get_section_block(self, y: int) -> blocks.Block|None:
+        """Return the block the section containing the line y is made of, or None if it has several blocks (or the chunk is packed)"""
+        if self.packed_blocks is not None: return None
+        section = self.sections[y // self.SECTION_HEIGHT]
+        if type(section) is int:
+            return blocks.REVERSED_BLOCKS_DICT[section]
+        return None
+
+    def set_block(self, x: int, y: int, block: blocks.Block) -> None:
+        """Set the block, creating the section if it was made of a single block (see compact to remove it)"""
+        block_id = blocks.BLOCKS_DICT[block]
+        if y >= self.heights[x]:
+            self._update_height(x, y, block)
+        if self.packed_blocks is not None:
+            self.packed_blocks.set(x + y * self.LENGTH, block_id)
+            return
+        section_index = y // self.SECTION_HEIGHT
+        section = self.sections[section_index]
+        if type(section) is int:
+            if section == block_id: return
+            section = bytearray((section,)) * (self.LENGTH * self.SECTION_HEIGHT)
+            self.sections[section_index] = section
+        elif type(section) is not bytearray:
+            # copy on write
+            section = bytearray(section)
+            self.sections[section_index] = section
+        section[x + y % self.SECTION_HEIGHT * self.LENGTH] = block_id
+
+    def carve_column(self, x: int, start_y: int, end_y: int) -> None:
+        """Replace the non traversable blocks of the column from start_y to end_y (excluded) by air, a section at a time"""
+        if start_y >= end_y: return
+        if self.packed_blocks is not None:
+            air_id = blocks.BLOCKS_DICT[blocks.AIR]
+            for i in range(x + start_y * self.LENGTH, x + end_y * self.LENGTH, self.LENGTH):
+                if NOT_TRAVERSABLE_IDS_TABLE[self.packed_blocks.get(i)]:
+                    self.packed_blocks.set(i, air_id)
+        else:
+            for section_index in range(start_y // self.SECTION_HEIGHT, (end_y - 1) // self.SECTION_HEIGHT + 1):
+                section = self.sections[section_index]
+                if type(section) is int:
+                    if not NOT_TRAVERSABLE_IDS_TABLE[section]: continue
+                    section = bytearray((section,)) * (self.LENGTH * self.SECTION_HEIGHT)
+                    self.sections[section_index] = section
+                elif type(section) is not bytearray:
+                    # copy on write
+                    section = bytearray(section)
+                    self.sections[section_index] = section
+                section_y = section_index * self.SECTION_HEIGHT
+                start = x + (max(start_y, section_y) - section_y) * self.LENGTH
+                end = x + (min(end_y, section_y + self.SECTION_HEIGHT) - section_y) * self.LENGTH
+                section[start:end:self.LENGTH] = section[start:end:self.LENGTH].translate(CARVED_IDS_TABLE)
+        if start_y <= self.heights[x] < end_y:
+            # the highest block is removed
+            self._update_height(x, self.heights[x], blocks.AIR)
 
-def blocks_to_int(blocks_list: list[list[blocks.Block]]) -> list[int]:
-    """
-    Transform a matrix of blocks into a single one-dimensional list of integers
-    """
-    return [blocks.BLOCKS_DICT[blocks_list[i // len(blocks_list[0])][i % len(blocks_list[0])]] for i in range(len(blocks_list) * len(blocks_list[0]))]
+    def get_height(self, x: int) -> int:
+        """Return the y of the highest non traversable block of the column, or 0 if there is none"""
+        return self.heights[x]
 
+    def _update_height(self, x: int, y: int, block: blocks.Block) -> None:
+        """Must be called before the block at (x, y) is replaced by the given block, when y is at least the column's height"""
+        if block not in blocks.TRAVERSABLE_BLOCKS:
+            self.heights[x] = y
+        elif y == self.heights[x]:
+            # the highest block is removed, search the next one
+            y -= 1
+            while y > 0 and self.get_block(x, y) in blocks.TRAVERSABLE_BLOCKS:
+                y -= 1
+            self.heights[x] = max(y, 0)
 
-def int_to_blocks(ints: list[int]) -> list[list[blocks.Block]]:
-    """
-    Transform a list of integers into a matrix of blocks
-    """
+    def compute_heights(self) -> None:
+        not_traversable = self.get_blocks_ids().translate(NOT_TRAVERSABLE_IDS_TABLE)
+        for x in range(self.LENGTH):
+            self.heights[x] = max(not_traversable[x::self.LENGTH].rfind(1), 0)
 
-    return [[blocks.REVERSED_BLOCKS_DICT[ints[x + y * Chunk.LENGTH]] for x in range(Chunk.LENGTH)] for y in range(Chunk.HEIGHT)]
+    def compact(self, y: int|None = None) -> None:
+        """Store the sections made of a single block as this block's id. If y is given, only check the section containing this line."""
+        if self.packed_blocks is not None: return
+        indexes = range(len(self.sections)) if y is None else (y // self.SECTION_HEIGHT,)
+        for i in indexes:
+            section = self.sections[i]
+            if type(section) is int: continue
+            if type(section) is not bytearray:
+                is_uniform = section == bytes(section[:1]) * len(section)
+            else:
+                is_uniform = section.count(section[0]) == len(section)
+            if is_uniform:
+                self.sections[i] = section[0]
 
+    def get_blocks_ids(self) -> bytearray:
+        """Return the ids of every block, as a flat array line by line from the bottom"""
+        if self.packed_blocks is not None:
+            return self.packed_blocks.get_ids()
+        blocks_ids = bytearray()
+        for section in self.sections:
+            if type(section) is int:
+                blocks_ids += bytearray((section,)) * (self.LENGTH * self.SECTION_HEIGHT)
+            else:
+                blocks_ids += section
+        return blocks_ids
+
+    def set_blocks_ids(self, blocks_ids: bytearray|memoryview) -> None:
+        self._set_sections(blocks_ids)
+        self.compute_heights()
+
+    def _set_sections(self, blocks_ids: bytearray|memoryview) -> None:
+        self.packed_blocks = None
+        section_size = self.LENGTH * self.SECTION_HEIGHT
+        if type(blocks_ids) is memoryview and blocks_ids.readonly:
+            self.sections = [blocks_ids[i:i + section_size] for i in range(0, self.LENGTH * self.HEIGHT, section_size)]
+        else:
+            self.sections = [bytearray(blocks_ids[i:i + section_size]) for i in range(0, self.LENGTH * self.HEIGHT, section_size)]
+        self.compact()
+
+    def pack(self) -> None:
+        """Store the blocks with a palette and bit-packed indexes, using less memory but slower to access"""
+        if self.packed_blocks is not None: return
+        self.packed_blocks = PalettedBlocks(self.get_blocks_ids())
+        self.sections = []
+
+    def unpack(self) -> None:
+        if self.packed_blocks is None: return
+        self._set_sections(self.packed_blocks.get_ids())
+
+    def copy(self) -> 'Chunk':
+        chunk = Chunk(self.id, self.direction, self.biome)
+        # read-only sections can be shared, they are copied when written
+        chunk.sections = [bytearray(section) if type(section) is bytearray else section for section in self.sections]
+        if self.packed_blocks is not None:
+            chunk.packed_blocks = self.packed_blocks.copy()
+        chunk.heights = self.heights.copy()
+        chunk.is_forest = self.is_forest
+        chunk.is_modified = self.is_modified
+        chunk.is_saved = self.is_saved
+        chunk.generation_state = self.generation_state
+        return chunk
+
+    def get_size(self) -> int:
+        """Number of bytes used to store the blocks"""
+        if self.packed_blocks is not None:
+            return self.packed_blocks.get_size()
+        return sum(1 if type(section) is int else len(section) for section in self.sections)
+
+    def __repr__(self) -> str:
+        return f'id: {self.id}, direction: {self.direction}, biome: {self.biome.name}, is_forest: {self.is_forest}'
@@ -1,12 +1,61 @@
 import biomes
 import blocks
+import math
 import random
+from collections import deque
 from map_chunk import Chunk
 from tree import Tree
 from typing import Any
+try:
+    import numpy
+except ImportError:
+    # optional, the land is then shaped block by block
+    numpy = None
+
+class LandColumns:
+    def __init__(self) -> None:
+        """
+        Land of a chunk, recorded column by column while the random values are drawn in the same order as when it is shaped block by block,
+        and filled at once with NumPy (see MapGenerator.fill_land).
+        """
+        self.heights: list[int] = [0] * Chunk.LENGTH
+        # for each zone, the block id of each column and the lines [start, end) where it replaces the stone
+        self.zones: list[tuple[list[int], list[int], list[int]]] = []
+        # columns mixing two biomes, whose blocks depend on the random values drawn block by block, already filled
+        self.columns: dict[int, bytearray] = {}
+
+    def add_zone(self, index: int, x: int, block_id: int, start: int, end: int) -> None:
+        while len(self.zones) <= index:
+            self.zones.append(([0] * Chunk.LENGTH, [0] * Chunk.LENGTH, [0] * Chunk.LENGTH))
+        zone_ids, starts, ends = self.zones[index]
+        zone_ids[x] = block_id
+        starts[x] = start
+        ends[x] = end
 
 class MapGenerator:
-    def __init__(self, seed: str|None = None) -> None:
+    # random access generation: number of chunks of the biome cells, the biome changing during the second half of each cell
+    BIOME_CELL_LENGTH = 8
+    # random access generation: number of chunks of the forest cells, which are all forests or not
+    FOREST_CELL_LENGTH = 3
+    MAX_CAVE_RADIUS = 7
+    # version of the generation, kept in the generation state of the chunks (see get_state),
+    # to increase when the generator doesn't generate the same chunks anymore (the older versions must still be generated)
+    # 2: ore veins grown without queuing the blocks several times
+    GENERATION_VERSION = 2
+    # carved disc of each radius (see get_carved_disc)
+    _carved_discs: dict[int, list[tuple[int, int]]] = {}
+
+    def __init__(self, seed: str|None = None, random_access: bool = False) -> None:
+        """
+        By default, each chunk is generated from the state left by the previous chunk in the same direction,
+        so the chunks must be generated in order from the chunk 0.
+        If random_access is True, each chunk is generated only from the seed and its id (see generate_random_access_chunk),
+        so the chunks can be generated in any order, in parallel, and generated again at will.
+        """
+        self.random_access: bool = random_access
+        self.generation_version: int = self.GENERATION_VERSION
+        # shape the land with NumPy if it is installed, giving the same chunks
+        self.use_numpy: bool = numpy is not None
         if seed is None:
             self.seed = str(random.randint(-500000000, 500000000))
         else:
@@ -19,10 +68,13 @@ class MapGenerator:
         self.temperature_values: list[int] = []
         self.humidity_values: list[int] = []
         self.last_caves_pos_and_sizes: list[list[tuple[int, int]]] = []
+        # own random generator, so the generation doesn't depend on (nor changes) the global random state, whatever the thread
+        self._random: random.Random = random.Random()
 
     def get_infos_to_save(self) -> dict[str, Any]:
         return {
             'seed': self.seed,
+            'random_access': self.random_access,
             'are_last_biomes_forests': self.are_last_biomes_forests,
             'last_biomes': [biomes.get_biome_environment_values(biome) if biome is not None else biome for biome in self.last_biomes],
             'biome_height_values': self.biome_height_values,
@@ -34,6 +86,8 @@ class MapGenerator:
 
     def set_infos(self, infos: dict[str, Any]):
         self.seed = infos['seed']
+        # worlds created before the random access generation
+        self.random_access = infos.get('random_access', False)
         self.are_last_biomes_forests = infos['are_last_biomes_forests']
         self.last_biomes = [biomes.BIOMES[tuple(biome)] if biome is not None else biome for biome in infos['last_biomes']]
         self.biome_height_values = infos['biome_height_values']
@@ -44,19 +98,53 @@ class MapGenerator:
         
 
     def create_seeds(self) -> None:
-        random.seed(self.seed)
+        self._random.seed(self.seed)
         self.last_biomes = [None, None]
-        self.biome_height_values = [random.randint(0, 2)] * 2
-        self.are_last_biomes_forests = [bool(random.randint(0, 1))] * 2
+        self.biome_height_values = [self._random.randint(0, 2)] * 2
+        self.are_last_biomes_forests = [bool(self._random.randint(0, 1))] * 2
         self.last_block_height_values = [None] * 2
         self.last_caves_pos_and_sizes = [[], []]
         self.temperature_values = [1, 1]
         self.humidity_values = [1, 1]
 
-    @staticmethod
-    def generate_number(previous_value: int, max_gap: int, min_value: int, max_value: int, keep_same: float = 0.5) -> int:
-        if random.random() < keep_same: return previous_value
-        return min(max_value, max(min_value, previous_value + random.randint(-max_gap, max_gap)))
+    def get_state(self, direction: bool) -> dict[str, Any]:
+        """Return what generate_chunk uses, with the seed, to generate the next chunk in the given direction"""
+        # the random access generation only uses the seed
+        if self.random_access: return {'seed': self.seed, 'generation_version': self.generation_version}
+        last_biome = self.last_biomes[direction]
+        return {
+            'seed': self.seed,
+            'generation_version': self.generation_version,
+            'is_last_biome_forest': self.are_last_biomes_forests[direction],
+            'last_biome': biomes.get_biome_environment_values(last_biome) if last_biome is not None else last_biome,
+            'biome_height_value': self.biome_height_values[direction],
+            'last_block_height_value': self.last_block_height_values[direction],
+            'temperature_value': self.temperature_values[direction],
+            'humidity_value': self.humidity_values[direction],
+            'last_caves_pos_and_sizes': list(self.last_caves_pos_and_sizes[direction])
+        }
+
+    @classmethod
+    def generate_chunk_from_state(cls, state: dict[str, Any], direction: bool, id: int) -> Chunk:
+        """Generate again a chunk, from the state the generator had before generating it (see get_state)"""
+        map_generator = cls(state['seed'], 'last_biome' not in state)
+        # states saved before the generation versions
+        map_generator.generation_version = state.get('generation_version', 1)
+        if map_generator.random_access:
+            return map_generator.generate_chunk(direction, id)
+        last_biome = state['last_biome']
+        map_generator.are_last_biomes_forests = [state['is_last_biome_forest']] * 2
+        map_generator.last_biomes = [biomes.BIOMES[tuple(last_biome)] if last_biome is not None else last_biome] * 2
+        map_generator.biome_height_values = [state['biome_height_value']] * 2
+        map_generator.last_block_height_values = [state['last_block_height_value']] * 2
+        map_generator.temperature_values = [state['temperature_value']] * 2
+        map_generator.humidity_values = [state['humidity_value']] * 2
+        map_generator.last_caves_pos_and_sizes = [[tuple(cave) for cave in state['last_caves_pos_and_sizes']]] * 2
+        return map_generator.generate_chunk(direction, id)
+
+    def generate_number(self, previous_value: int, max_gap: int, min_value: int, max_value: int, keep_same: float = 0.5) -> int:
+        if self._random.random() < keep_same: return previous_value
+        return min(max_value, max(min_value, previous_value + self._random.randint(-max_gap, max_gap)))
 
     def create_new_biome_values(self) -> tuple[int, int]:
         return (1, 1)
@@ -66,8 +154,8 @@ class MapGenerator:
         previous_biome_distance = 0
         if last_height is None:
             last_height = chunk.biome.min_height + (chunk.biome.max_height - chunk.biome.min_height) // 2
-        chunk.blocks = [[blocks.AIR for _ in range(Chunk.LENGTH)] for _ in range(Chunk.HEIGHT)]
         used_biome = None
+        land = LandColumns() if self.use_numpy else None
         for x in range(Chunk.LENGTH):
             used_x = x if chunk.direction else (Chunk.LENGTH - 1 - x)
             last_biome = self.last_biomes[chunk.direction]
@@ -80,36 +168,81 @@ class MapGenerator:
             
             min_ = max(min(chunk.biome.min_height - last_height, 0), -used_biome.max_height_difference)
             max_ = min(max(chunk.biome.max_height - last_height, 0), used_biome.max_height_difference)
-            height = last_height + random.randint(min_, max_)
+            height = last_height + self._random.randint(min_, max_)
             height = min(Chunk.HEIGHT - 1, height)
-            for y in range(height):
-                chunk.blocks[y][used_x] = blocks.STONE
-            for y in range(height, self.water_height):
-                chunk.blocks[y][used_x] = blocks.WATER
             if 0 < previous_biome_distance < 3 and last_biome is not None:
                 used_biome = last_biome
                 biome2 = chunk.biome
             else:
                 biome2 = None
-            self.place_biome_blocks(chunk.blocks, used_biome, used_x, height, biome2)
+            self.fill_column(chunk, land, used_x, height, used_biome, biome2)
             last_height = height
             if x == 0 and chunk.id == 0:
                 self.last_block_height_values[not chunk.direction] = height
+        if land is not None:
+            self.fill_land(chunk, land)
         self.last_biomes[chunk.direction] = used_biome
         if chunk.id == 0:
             self.last_biomes[not chunk.direction] = used_biome
 
         self.last_block_height_values[chunk.direction] = last_height
 
-    def place_biome_blocks(self, blocks_chunk: list[list[blocks.Block]], biome: biomes.Biome, x: int, last_height_before: int, biome2: biomes.Biome|None = None) -> None:
+    def fill_column(self, chunk: Chunk, land: LandColumns|None, x: int, height: int, biome: biomes.Biome, biome2: biomes.Biome|None = None) -> None:
+        """
+        Place the stone up to the height, the water up to the water height and the biomes' blocks (see place_biome_blocks) in the column,
+        or record them in land to fill every column at once with fill_land.
+        """
+        if land is None:
+            for y in range(height):
+                chunk.set_block(x, y, blocks.STONE)
+            for y in range(height, self.water_height):
+                chunk.set_block(x, y, blocks.WATER)
+            self.place_biome_blocks(chunk, biome, x, height, biome2)
+            return
+        land.heights[x] = height
+        if biome2 is not None:
+            # the second biome's blocks depend on the blocks under them, place them block by block in a chunk of one column
+            column_ids = numpy.zeros((Chunk.HEIGHT, Chunk.LENGTH), numpy.uint8)
+            column_ids[:height, 0] = blocks.BLOCKS_DICT[blocks.STONE]
+            column_ids[height:self.water_height, 0] = blocks.BLOCKS_DICT[blocks.WATER]
+            column_chunk = Chunk(chunk.id, chunk.direction, chunk.biome, bytearray(column_ids.tobytes()))
+            self.place_biome_blocks(column_chunk, biome, 0, height, biome2)
+            land.columns[x] = column_chunk.get_blocks_ids()[::Chunk.LENGTH]
+            return
+        # same values as place_biome_blocks
+        last_add_y = 0
+        last_height = height
+        for i, zone in enumerate(biome.blocks_by_zone):
+            add_y = self._random.randint(0, 5)
+            min_height = max(zone[1] + add_y, last_height - zone[2])
+            land.add_zone(i, x, blocks.BLOCKS_DICT[zone[0]], min_height, last_height + last_add_y)
+            last_add_y = add_y
+            last_height = min_height
+
+    def fill_land(self, chunk: Chunk, land: LandColumns) -> None:
+        """Fill the chunk, full of air, with the land recorded by fill_column, with a few operations on the whole array of ids"""
+        ys = numpy.arange(Chunk.HEIGHT)[:, None]
+        heights = numpy.array(land.heights)
+        is_stone = ys < heights
+        ids = numpy.where(is_stone, blocks.BLOCKS_DICT[blocks.STONE], numpy.where(ys < self.water_height, blocks.BLOCKS_DICT[blocks.WATER], blocks.BLOCKS_DICT[blocks.AIR])).astype(numpy.uint8)
+        # a zone only replaces the stone, so the first zones have the priority over the next ones
+        for zone_ids, starts, ends in reversed(land.zones):
+            numpy.copyto(ids, numpy.array(zone_ids, numpy.uint8), where=is_stone & (ys >= numpy.array(starts)) & (ys < numpy.array(ends)))
+        sand_xs = numpy.flatnonzero(heights < self.water_height)
+        ids[heights[sand_xs], sand_xs] = blocks.BLOCKS_DICT[blocks.SAND]
+        for x, column_ids in land.columns.items():
+            ids[:, x] = numpy.frombuffer(column_ids, numpy.uint8)
+        chunk.set_blocks_ids(bytearray(ids.tobytes()))
+
+    def place_biome_blocks(self, chunk: Chunk, biome: biomes.Biome, x: int, last_height_before: int, biome2: biomes.Biome|None = None) -> None:
         last_add_y = 0
         last_height = last_height_before
         for zone in biome.blocks_by_zone:
-            add_y = random.randint(0, 5)
+            add_y = self._random.randint(0, 5)
             min_height = max(zone[1] + add_y, last_height - zone[2])
             for y in range(min_height, last_height + last_add_y):
-                if blocks_chunk[y][x] == blocks.STONE:
-                    blocks_chunk[y][x] = zone[0]
+                if chunk.get_block(x, y) == blocks.STONE:
+                    chunk.set_block(x, y, zone[0])
             last_add_y = add_y
             last_height = min_height      
 
@@ -117,64 +250,80 @@ class MapGenerator:
         last_height = last_height_before
         if biome2 is not None:
             for zone in biome2.blocks_by_zone + [(blocks.STONE, 0)]:
-                add_y = random.randint(0, 5)
+                add_y = self._random.randint(0, 5)
                 min_height = zone[1] + add_y
                 if len(zone) == 3:
                     min_height = max(min_height, last_height - zone[2])
                 for y in range(min_height, last_height + last_add_y):
-                    if blocks_chunk[y][x] not in blocks.TRAVERSABLE_BLOCKS and (y == 0 or blocks_chunk[y-1][x] not in blocks.TRAVERSABLE_BLOCKS) and random.random() > 0.4:
-                        blocks_chunk[y][x] = zone[0]
+                    if chunk.get_block(x, y) not in blocks.TRAVERSABLE_BLOCKS and (y == 0 or chunk.get_block(x, y - 1) not in blocks.TRAVERSABLE_BLOCKS) and self._random.random() > 0.4:
+                        chunk.set_block(x, y, zone[0])
                 last_add_y = add_y
                 last_height = min_height
         if last_height_before < self.water_height:
-            blocks_chunk[last_height_before][x] = blocks.SAND
+            chunk.set_block(x, last_height_before, blocks.SAND)
 
     @staticmethod
     def get_positions_for_ore_veins(chunk: Chunk, x: int, y: int, block: blocks.Block) -> list[tuple[int, int]]:
         pos: list[tuple[int, int]] = []
-        if x > 0 and chunk.blocks[y][x - 1] == block:
+        if x > 0 and chunk.get_block(x - 1, y) == block:
             pos.append((x - 1, y))
-        if x < Chunk.LENGTH - 1 and chunk.blocks[y][x + 1] == block:
+        if x < Chunk.LENGTH - 1 and chunk.get_block(x + 1, y) == block:
             pos.append((x + 1, y))
-        if y > 0 and chunk.blocks[y - 1][x] == block:
+        if y > 0 and chunk.get_block(x, y - 1) == block:
             pos.append((x, y - 1))
-        if y < Chunk.HEIGHT - 1 and chunk.blocks[y + 1][x] == block:
+        if y < Chunk.HEIGHT - 1 and chunk.get_block(x, y + 1) == block:
             pos.append((x, y + 1))
         return pos
 
     def place_ore_veins(self, chunk: Chunk) -> None:
-        nb_ore_veins = random.randint(*chunk.biome.ore_veins_qty)
+        nb_ore_veins = self._random.randint(*chunk.biome.ore_veins_qty)
         ore_veins_probabilities = [vein[0] for vein in chunk.biome.ore_veins_repartition]
         for _ in range(nb_ore_veins):
-            vein = random.choices(chunk.biome.ore_veins_repartition, weights=ore_veins_probabilities)[0]
-            vein_x = random.randrange(0, Chunk.LENGTH)
-            vein_y = random.randrange(vein[2], vein[3])
-            pos: list[tuple[int, int]] = []
-            if chunk.blocks[vein_y][vein_x] == blocks.STONE:
-                pos.append((vein_x, vein_y))
-            while pos:
-                x, y = pos.pop(0)
-                if random.random() < vein[4]:
-                    chunk.blocks[y][x] = vein[1]
-                    pos += self.get_positions_for_ore_veins(chunk, x, y, blocks.STONE)
-
-    def get_first_block_y(self, chunk: Chunk, x: int) -> int:
-        y = Chunk.HEIGHT - 1
-        while y > 0 and chunk.blocks[y][x] in blocks.TRAVERSABLE_BLOCKS:
-            y -= 1
-        return y
+            vein = self._random.choices(chunk.biome.ore_veins_repartition, weights=ore_veins_probabilities)[0]
+            vein_x = self._random.randrange(0, Chunk.LENGTH)
+            vein_y = self._random.randrange(vein[2], vein[3])
+            if chunk.get_block(vein_x, vein_y) != blocks.STONE: continue
+            if self.generation_version < 2:
+                self.grow_first_version_ore_vein(chunk, vein_x, vein_y, vein[1], vein[5])
+            else:
+                self.grow_ore_vein(chunk, vein_x, vein_y, vein[1], vein[4])
+
+    def grow_ore_vein(self, chunk: Chunk, vein_x: int, vein_y: int, block: blocks.Block, probability_to_expand: float) -> None:
+        # each stone block gets a single chance to join the vein, so the vein grows in linear time whatever its probability
+        visited = {(vein_x, vein_y)}
+        pos = deque(visited)
+        while pos:
+            x, y = pos.popleft()
+            if self._random.random() < probability_to_expand:
+                chunk.set_block(x, y, block)
+                for neighbor_pos in self.get_positions_for_ore_veins(chunk, x, y, blocks.STONE):
+                    if neighbor_pos not in visited:
+                        visited.add(neighbor_pos)
+                        pos.append(neighbor_pos)
+
+    def grow_first_version_ore_vein(self, chunk: Chunk, vein_x: int, vein_y: int, block: blocks.Block, probability_to_expand: float) -> None:
+        """
+        Vein growth of the generation version 1, which queues the blocks again for each neighbor joining the vein, even once they joined it.
+        Only kept to generate again the chunks saved with this version.
+        """
+        pos = [(vein_x, vein_y)]
+        while pos:
+            x, y = pos.pop(0)
+            if self._random.random() < probability_to_expand:
+                chunk.set_block(x, y, block)
+                pos += self.get_positions_for_ore_veins(chunk, x, y, blocks.STONE)
 
     @staticmethod
     def can_place_leave(chunk: Chunk, x: int, y: int) -> bool:
         if chunk.biome.tree is None: return False
-        if 0 > x or x >= Chunk.LENGTH - 1 or 0 > y or y >= Chunk.HEIGHT or chunk.blocks[y][x] != chunk.biome.tree.grows_in: return False
-        if x < Chunk.LENGTH - 1 and chunk.blocks[y][x + 1] in (chunk.biome.tree.trunk_block, chunk.biome.tree.leave_block):
+        if 0 > x or x >= Chunk.LENGTH - 1 or 0 > y or y >= Chunk.HEIGHT or chunk.get_block(x, y) != chunk.biome.tree.grows_in: return False
+        if x < Chunk.LENGTH - 1 and chunk.get_block(x + 1, y) in (chunk.biome.tree.trunk_block, chunk.biome.tree.leave_block):
             return True
-        if x > 0 and chunk.blocks[y][x - 1] in (chunk.biome.tree.trunk_block, chunk.biome.tree.leave_block):
+        if x > 0 and chunk.get_block(x - 1, y) in (chunk.biome.tree.trunk_block, chunk.biome.tree.leave_block):
             return True
-        if y < Chunk.HEIGHT - 1 and chunk.blocks[y + 1][x] in (chunk.biome.tree.trunk_block, chunk.biome.tree.leave_block):
+        if y < Chunk.HEIGHT - 1 and chunk.get_block(x, y + 1) in (chunk.biome.tree.trunk_block, chunk.biome.tree.leave_block):
             return True
-        if y > 0 and chunk.blocks[y - 1][x] in (chunk.biome.tree.trunk_block, chunk.biome.tree.leave_block):
+        if y > 0 and chunk.get_block(x, y - 1) in (chunk.biome.tree.trunk_block, chunk.biome.tree.leave_block):
             return True
         return False
 
@@ -186,94 +335,92 @@ class MapGenerator:
         else:
             spawn_chance = tree.tree_spawn_chance
         for start_x in range(tree.min_leaves_width + 1, Chunk.LENGTH - tree.min_leaves_width - 1):
-            if random.random() <= spawn_chance:
-                y = self.get_first_block_y(chunk, start_x)
-                if chunk.blocks[y][start_x] != blocks.GRASS: continue
-                chunk.blocks[y][start_x] = blocks.EARTH
+            if self._random.random() <= spawn_chance:
+                y = chunk.get_height(start_x)
+                if chunk.get_block(start_x, y) != blocks.GRASS: continue
+                chunk.set_block(start_x, y, blocks.EARTH)
                 i = 0
-                for i in range(1, random.randint(tree.min_trunk_height, tree.max_trunk_height)):
-                    if y + i < Chunk.HEIGHT and chunk.blocks[y + i][start_x] == tree.grows_in:
-                        chunk.blocks[y + i][start_x] = tree.trunk_block
+                for i in range(1, self._random.randint(tree.min_trunk_height, tree.max_trunk_height)):
+                    if y + i < Chunk.HEIGHT and chunk.get_block(start_x, y + i) == tree.grows_in:
+                        chunk.set_block(start_x, y + i, tree.trunk_block)
                     else:
                         break
                 if i < tree.min_trunk_height:
                     for j in range(i + 1):
-                        chunk.blocks[y + j][start_x] = tree.grows_in
+                        chunk.set_block(start_x, y + j, tree.grows_in)
                     continue
                 start_y = y + i
                 # leaves on the trunk
-                center_min_y = random.randint(-tree.max_leaves_height, -tree.min_leaves_height)
-                center_max_y = random.randint(tree.min_leaves_height, tree.max_leaves_height)
+                center_min_y = self._random.randint(-tree.max_leaves_height, -tree.min_leaves_height)
+                center_max_y = self._random.randint(tree.min_leaves_height, tree.max_leaves_height)
                 for y in range(1, center_max_y + 1):
                     if self.can_place_leave(chunk, start_x, start_y + y):
-                        chunk.blocks[start_y + y][start_x] = tree.leave_block
+                        chunk.set_block(start_x, start_y + y, tree.leave_block)
                 # leaves before trunk
                 min_y = center_min_y
                 max_y = center_max_y
-                nb_leaves_left = min(random.randint(-tree.max_leaves_width, -tree.min_leaves_width), min(start_x, Chunk.LENGTH - 1 - start_x))
+                nb_leaves_left = min(self._random.randint(-tree.max_leaves_width, -tree.min_leaves_width), min(start_x, Chunk.LENGTH - 1 - start_x))
                 for x in range(-1, nb_leaves_left - 1, -1):
-                    min_y, max_y = min(min_y + random.randint(0, 1), -tree.min_leaves_height), max(max_y - random.randint(0, 1), tree.min_leaves_height)
+                    min_y, max_y = min(min_y + self._random.randint(0, 1), -tree.min_leaves_height), max(max_y - self._random.randint(0, 1), tree.min_leaves_height)
                     for y in range(min_y, max_y + 1):
                         if self.can_place_leave(chunk, start_x + x, start_y + y):
-                            chunk.blocks[start_y + y][start_x + x] = tree.leave_block
+                            chunk.set_block(start_x + x, start_y + y, tree.leave_block)
                 # leaves after trunk
                 min_y = center_min_y
                 max_y = center_max_y
-                nb_leaves_right = min(max(nb_leaves_left + random.randint(-1, 1), tree.min_leaves_width), tree.max_leaves_width)
+                nb_leaves_right = min(max(nb_leaves_left + self._random.randint(-1, 1), tree.min_leaves_width), tree.max_leaves_width)
                 for x in range(1, nb_leaves_right + 2):
-                    min_y, max_y = min(min_y + random.randint(0, 1), -tree.min_leaves_height), max(max_y - random.randint(0, 1), tree.min_leaves_height)
+                    min_y, max_y = min(min_y + self._random.randint(0, 1), -tree.min_leaves_height), max(max_y - self._random.randint(0, 1), tree.min_leaves_height)
                     for y in range(min_y, max_y + 1):
                         if self.can_place_leave(chunk, start_x + x, start_y + y):
-                            chunk.blocks[start_y + y][start_x + x] = tree.leave_block
-
-    @staticmethod
-    def is_valid_pos(x: int, y: int, width: int, height: int) -> bool:
-        return 0 <= x < width and 0 <= y < height
+                            chunk.set_block(start_x + x, start_y + y, tree.leave_block)
 
-    def carve(self, chunk: Chunk, x: int, y: int, radius: int) -> None:
-        if radius == 0: return
+    @classmethod
+    def get_carved_disc(cls, radius: int) -> list[tuple[int, int]]:
+        """
+        Return the columns of the disc carved around a position, as (x offset, half height) carving from y - half height to y + half height (excluded).
+        The discs are computed once by radius, with the midpoint circle algorithm.
+        """
+        disc = cls._carved_discs.get(radius, None)
+        if disc is not None: return disc
+        half_heights: dict[int, int] = {}
         a = radius
         b = 0
         t1 = radius//16
         while a >= b:
-            tmp_x = x + a
-            for tmp_y in range(y - b, y + b):
-                if self.is_valid_pos(tmp_x, tmp_y, Chunk.LENGTH, Chunk.HEIGHT) and chunk.blocks[tmp_y][tmp_x] not in blocks.TRAVERSABLE_BLOCKS:
-                    chunk.blocks[tmp_y][tmp_x] = blocks.AIR
-            tmp_x = x + b
-            for tmp_y in range(y - a, y + a):
-                if self.is_valid_pos(tmp_x, tmp_y, Chunk.LENGTH, Chunk.HEIGHT) and chunk.blocks[tmp_y][tmp_x] not in blocks.TRAVERSABLE_BLOCKS:
-                    chunk.blocks[tmp_y][tmp_x] = blocks.AIR
-            tmp_x = x - a
-            for tmp_y in range(y - b, y + b):
-                if self.is_valid_pos(tmp_x, tmp_y, Chunk.LENGTH, Chunk.HEIGHT) and chunk.blocks[tmp_y][tmp_x] not in blocks.TRAVERSABLE_BLOCKS:
-                    chunk.blocks[tmp_y][tmp_x] = blocks.AIR
-            tmp_x = x - b
-            for tmp_y in range(y - a, y + a):
-                if self.is_valid_pos(tmp_x, tmp_y, Chunk.LENGTH, Chunk.HEIGHT) and chunk.blocks[tmp_y][tmp_x] not in blocks.TRAVERSABLE_BLOCKS:
-                    chunk.blocks[tmp_y][tmp_x] = blocks.AIR
+            for x, half_height in ((a, b), (b, a), (-a, b), (-b, a)):
+                if half_height > half_heights.get(x, 0):
+                    half_heights[x] = half_height
             b += 1
             t1 += b
             t2 = t1 - a
             if t2 >= 0:
                 t1 = t2
                 a -= 1
+        disc = sorted(half_heights.items())
+        cls._carved_discs[radius] = disc
+        return disc
+
+    def carve(self, chunk: Chunk, x: int, y: int, radius: int) -> None:
+        for offset, half_height in self.get_carved_disc(radius):
+            if 0 <= x + offset < Chunk.LENGTH:
+                chunk.carve_column(x + offset, max(y - half_height, 0), min(y + half_height, Chunk.HEIGHT))
 
 
     def create_caves(self, chunk: Chunk) -> None:
         caves_pos_and_sizes: list[tuple[int, int]] = []
         max_cave_radius = 7
-        for _ in range(random.randint(len(self.last_caves_pos_and_sizes[chunk.direction]), 2)):
+        for _ in range(self._random.randint(len(self.last_caves_pos_and_sizes[chunk.direction]), 2)):
             force_continue = False
             if self.last_caves_pos_and_sizes[chunk.direction]:
                 start_y, radius = self.last_caves_pos_and_sizes[chunk.direction].pop(0)
                 x = 0 if chunk.direction else Chunk.LENGTH - 1
                 force_continue = True
             else:
-                radius = random.randint(0, max_cave_radius)
-                x = random.randrange(radius * chunk.direction, Chunk.LENGTH - radius * (not chunk.direction))
-                y = self.get_first_block_y(chunk, x)
-                start_y = random.randint(0, y - radius)
+                radius = self._random.randint(0, max_cave_radius)
+                x = self._random.randrange(radius * chunk.direction, Chunk.LENGTH - radius * (not chunk.direction))
+                y = chunk.get_height(x)
+                start_y = self._random.randint(0, y - radius)
             while True:
                 self.carve(chunk, x, start_y, radius)
                 if (chunk.direction and x + radius >= Chunk.LENGTH - 1) or (not chunk.direction and x - radius <= 0):
@@ -281,16 +428,16 @@ class MapGenerator:
                 if (chunk.direction and x == Chunk.LENGTH - 1) or (not chunk.direction and x == 0):
                     caves_pos_and_sizes.append((start_y, radius))
                     break
-                if not force_continue and not random.randint(0, 15):
+                if not force_continue and not self._random.randint(0, 15):
                     break
                 force_continue = False
                 x += 1 if chunk.direction else -1
-                if start_y > 0 and random.randint(0, 1):
+                if start_y > 0 and self._random.randint(0, 1):
                     start_y -= 1
-                elif start_y < self.get_first_block_y(chunk, x) and random.randint(0, 1):
+                elif start_y < chunk.get_height(x) and self._random.randint(0, 1):
                     start_y += 1
 
-                radius += random.randint(-1, 1)
+                radius += self._random.randint(-1, 1)
                 if radius > max_cave_radius:
                     radius -= 1
                 elif radius < 0:
@@ -298,11 +445,146 @@ class MapGenerator:
         self.last_caves_pos_and_sizes[chunk.direction] = caves_pos_and_sizes
 
 
+    def _get_random(self, *keys: Any) -> random.Random:
+        """Return a random generator depending only on the seed and the given keys"""
+        return random.Random(':'.join(str(key) for key in (self.seed,) + keys))
+
+    def _get_cell_biome_height_value(self, cell: int) -> int:
+        return self._get_random('biome', cell).choices((-1, 0, 1, 2, 3), weights=(1, 3, 3, 2, 1))[0]
+
+    def get_biome(self, id: int) -> biomes.Biome:
+        """Return the biome of the chunk with the random access generation, which differs by one height value at most from the neighbor chunks' ones"""
+        cell, position = divmod(id, self.BIOME_CELL_LENGTH)
+        height = self._get_cell_biome_height_value(cell)
+        half_length = self.BIOME_CELL_LENGTH // 2
+        if position >= half_length:
+            # go to the next cell's value, one step at most by chunk
+            next_height = self._get_cell_biome_height_value(cell + 1)
+            progress = (position - half_length + 1) / half_length
+            height = math.floor(height + (next_height - height) * progress + 0.5)
+        return biomes.BIOMES[(height, *self.create_new_biome_values())]
+
+    def get_border_height(self, border: int) -> int:
+        """Return the height of the first column of the chunk with the id border, in the heights of both the chunk's and the previous chunk's biomes"""
+        left_biome = self.get_biome(border - 1)
+        right_biome = self.get_biome(border)
+        min_height = max(left_biome.min_height, right_biome.min_height)
+        max_height = min(left_biome.max_height, right_biome.max_height)
+        # the heights of the biomes don't overlap, use a height between them
+        if min_height > max_height:
+            min_height, max_height = max_height, min_height
+        return self._get_random('border', border).randint(min_height, max_height)
+
+    def get_border_caves(self, border: int) -> list[tuple[int, int]]:
+        """Return the caves (y, radius) crossing the border between the chunk with the id border and the previous chunk"""
+        border_random = self._get_random('caves', border)
+        height = self.get_border_height(border)
+        caves: list[tuple[int, int]] = []
+        for _ in range(border_random.choices((0, 1, 2), weights=(2, 2, 1))[0]):
+            radius = border_random.randint(1, self.MAX_CAVE_RADIUS)
+            caves.append((border_random.randint(radius, height - radius), radius))
+        return caves
+
+    def generate_random_access_land_shape(self, chunk: Chunk) -> None:
+        """
+        Same as generate_land_shape, but the heights go from the chunk's border height (see get_border_height) to the next one,
+        instead of continuing the previous chunk.
+        """
+        left_biome = self.get_biome(chunk.id - 1)
+        right_biome = self.get_biome(chunk.id + 1)
+        height = self.get_border_height(chunk.id)
+        next_height = self.get_border_height(chunk.id + 1)
+        biome_distance = 0
+        land = LandColumns() if self.use_numpy else None
+        for x in range(Chunk.LENGTH):
+            max_height_difference = chunk.biome.max_height_difference
+            if x:
+                min_ = max(min(chunk.biome.min_height - height, 0), -max_height_difference)
+                max_ = min(max(chunk.biome.max_height - height, 0), max_height_difference)
+                height += self._random.randint(min_, max_)
+                # the next chunk's border height must stay reachable
+                nb_remaining_columns = Chunk.LENGTH - x
+                height = min(max(height, next_height - nb_remaining_columns * max_height_difference), next_height + nb_remaining_columns * max_height_difference)
+            height = min(Chunk.HEIGHT - 1, height)
+            neighbor_biome = left_biome if x < Chunk.LENGTH // 2 else right_biome
+            if height > chunk.biome.max_height or height < chunk.biome.min_height:
+                used_biome = neighbor_biome
+                biome_distance = 0
+            else:
+                used_biome = chunk.biome
+                biome_distance += 1
+            biome2 = None
+            if 0 < biome_distance < 3 and neighbor_biome is not chunk.biome:
+                used_biome = neighbor_biome
+                biome2 = chunk.biome
+            self.fill_column(chunk, land, x, height, used_biome, biome2)
+        if land is not None:
+            self.fill_land(chunk, land)
+
+    def dig_cave(self, chunk: Chunk, x: int, y: int, radius: int, step: int) -> None:
+        """
+        Carve a cave from (x, y) in the direction of step (1 or -1), until it randomly stops or would reach the chunk's border.
+        The cave doesn't change while it reaches the border behind it, so what it would carve in the neighbor chunk
+        is already carved by the neighbor chunk (see create_random_access_caves).
+        """
+        while True:
+            self.carve(chunk, x, y, radius)
+            if not self._random.randint(0, 15): return
+            if not 0 <= x + step * (radius + 1) < Chunk.LENGTH: return
+            x += step
+            if (x - radius if step == 1 else Chunk.LENGTH - 1 - x - radius) < 0: continue
+            if y > radius and self._random.randint(0, 1):
+                y -= 1
+            elif y < chunk.get_height(x) - radius and self._random.randint(0, 1):
+                y += 1
+            radius = min(max(radius + self._random.randint(-1, 1), 1), self.MAX_CAVE_RADIUS)
+
+    def create_random_access_caves(self, chunk: Chunk) -> None:
+        """
+        The caves crossing a border (see get_border_caves) are carved by both chunks around the border, in their own border column and the neighbor's one,
+        so they match whatever the generation order, and each of them continues the cave in its chunk.
+        """
+        for border, x, step in ((chunk.id, 0, 1), (chunk.id + 1, Chunk.LENGTH - 1, -1)):
+            for y, radius in self.get_border_caves(border):
+                self.carve(chunk, x - step, y, radius)
+                self.dig_cave(chunk, x, y, radius, step)
+        for _ in range(self._random.randint(0, 1)):
+            radius = self._random.randint(1, self.MAX_CAVE_RADIUS)
+            x = self._random.randrange(radius, Chunk.LENGTH - radius)
+            height = chunk.get_height(x)
+            if height < 2 * radius: continue
+            self.dig_cave(chunk, x, self._random.randint(radius, height - radius), radius, self._random.choice((-1, 1)))
+
+    def generate_random_access_chunk(self, direction: bool, id: int) -> Chunk:
+        """
+        Generate the chunk only from the seed and its id, with the values of its borders shared with the neighbor chunks
+        (biomes, heights and caves, see get_biome, get_border_height and get_border_caves), so the chunks match whatever the generation order.
+        """
+        self._random.seed(f'{self.seed}:chunk:{id}')
+        biome = self.get_biome(id)
+        chunk = Chunk(id, direction, biome)
+        chunk.generation_state = self.get_state(direction)
+        self.generate_random_access_land_shape(chunk)
+        self.create_random_access_caves(chunk)
+        self.place_ore_veins(chunk)
+        if biome.tree is not None:
+            # probability of being in a forest of the sequential generation
+            forest_chance = biome.tree.forest_spawn_chance / (biome.tree.forest_spawn_chance + 1 - biome.tree.stay_forest_chance)
+            chunk.is_forest = self._get_random('forest', id // self.FOREST_CELL_LENGTH).random() < forest_chance
+            self.create_trees(chunk)
+        else:
+            chunk.is_forest = False
+        chunk.compact()
+        chunk.is_modified = True
+        return chunk
+
     def generate_chunk(self, direction: bool, id: int) -> Chunk:
         """direction: 0 -> left, 1 -> right"""
+        if self.random_access:
+            return self.generate_random_access_chunk(direction, id)
         # TODO: add use for temperature and humidity values
-        rand_state = random.getstate()
-        random.seed(f'{self.seed}{id}')
+        generation_state = self.get_state(direction)
+        self._random.seed(f'{self.seed}{id}')
 
         height = self.biome_height_values[direction]
         temperature = self.temperature_values[direction]
@@ -310,27 +592,29 @@ class MapGenerator:
         biome = biomes.BIOMES[(height, temperature, humidity)]
 
         chunk = Chunk(id, direction, biome)
+        chunk.generation_state = generation_state
         self.generate_land_shape(chunk)
         self.create_caves(chunk)
         self.place_ore_veins(chunk)
         if biome.tree is not None:
             chunk.is_forest = self.are_last_biomes_forests[direction]
             if chunk.is_forest:
-                if random.random() > biome.tree.stay_forest_chance:
+                if self._random.random() > biome.tree.stay_forest_chance:
                     chunk.is_forest = False
             else:
-                if random.random() <= biome.tree.forest_spawn_chance:
+                if self._random.random() <= biome.tree.forest_spawn_chance:
                     chunk.is_forest = True
             self.are_last_biomes_forests[direction] = chunk.is_forest
             self.create_trees(chunk)
         else:
             chunk.is_forest = False
+        chunk.compact()
+        chunk.is_modified = True
 
         self.biome_height_values[direction] = self.generate_number(self.biome_height_values[direction], 1, -1, 3, keep_same=0.4)
         self.temperature_values[direction], self.humidity_values[direction] = self.create_new_biome_values()
 
         # updates states and values
-        random.setstate(rand_state)
         if chunk.id == 0:
             self.biome_height_values[not direction] = self.biome_height_values[direction]
         return chunk
\ No newline at end of file
@@ -3,9 +3,9 @@ from gui.ui_manager import UIManager
 from gui import elements
 from gui.ui_element import UIElement
 import pygame
-from time import monotonic
+from time import monotonic, localtime, strftime
 import os
-from save_manager import SAVES_PATH
+import save_catalog
 from module_infos import SRC_PATH
 
 EXIT = 0
@@ -170,10 +170,36 @@ class LoadSaveMenu(Menu):
         options_container.add_element(load_button)
         options_container.add_element(delete_button)
         self._elements.append(elements.TextButton(self.ui_manager, 'QUIT', self.exit_menu, anchor='bottom', y='-10%'))
+        self.save_infos_label = elements.Label(self.ui_manager, x='-10%', y='15%', anchor='right')
+        self._elements.append(self.save_infos_label)
+        self.catalog = save_catalog.load_catalog()
+        self._displayed_save_name: str|None = None
         self.add_saves()
-    
+        save_catalog.remove_deleted_saves()
+
     def add_saves(self) -> None:
-        self.saves_list.add_elements(os.listdir(SAVES_PATH))
+        """Add the saves from the last played one, using the saves' catalog"""
+        self.saves_list.add_elements(save_catalog.get_sorted_save_names(self.catalog))
+
+    def get_save_infos_text(self, save_name: str) -> str:
+        metadata = self.catalog.get(save_name, {})
+        texts = []
+        if metadata.get('last_played', None) is not None:
+            texts.append(f'Last played: {strftime("%Y-%m-%d %H:%M", localtime(metadata["last_played"]))}')
+        if metadata.get('size', None) is not None:
+            texts.append(f'Size: {metadata["size"] / 1_000_000:.1f} MB')
+        if metadata.get('nb_chunks', None) is not None:
+            texts.append(f'Chunks: {metadata["nb_chunks"]}')
+        if metadata.get('seed', None) is not None:
+            texts.append(f'Seed: {metadata["seed"]}')
+        return ' - '.join(texts)
+
+    def run_functions_end_loop(self) -> None:
+        selected = self.saves_list.child_selected
+        save_name = None if selected is None else selected.get_text()
+        if save_name == self._displayed_save_name: return
+        self._displayed_save_name = save_name
+        self.save_infos_label.set_text('' if save_name is None else self.get_save_infos_text(save_name))
 
     def load_save(self, _: UIElement) -> None:
         selected = self.saves_list.child_selected
@@ -183,17 +209,8 @@ class LoadSaveMenu(Menu):
     def delete_save(self, _: UIElement) -> None:
         selected = self.saves_list.child_selected
         if selected is None: return
-        path = os.path.join(SAVES_PATH, selected.get_text())
+        save_name = selected.get_text()
         selected.clear_elements_list()
         self.saves_list.remove_element(selected)
-        if not os.path.exists(path): return
-        self.delete_folder(path)
-
-    def delete_folder(self, path) -> None:
-        for file in os.listdir(path):
-            file_path = os.path.join(path, file)
-            if os.path.isdir(file_path):
-                self.delete_folder(file_path)
-            else:
-                os.remove(file_path)
-        os.rmdir(path)
+        self.catalog.pop(save_name, None)
+        save_catalog.delete_save(save_name)
@@ -0,0 +1,107 @@
+class PalettedBlocks:
+    def __init__(self, blocks_ids: bytes|bytearray) -> None:
+        """
+        Compact storage of a list of blocks ids.
+        Each different id is stored once in the palette, and each block is stored as its index in the palette,
+        using the minimum number of bits (0, 1, 2, 4 or 8) needed for the palette size.
+        """
+        self.palette: bytearray = bytearray()
+        self.bits: int = 0
+        self.data: bytearray = bytearray()
+        self.length: int = 0
+        self.set_ids(blocks_ids)
+
+    @classmethod
+    def from_data(cls, palette: bytes|bytearray, bits: int, length: int, data: bytes|bytearray) -> 'PalettedBlocks':
+        paletted_blocks = cls(b'')
+        paletted_blocks.palette = bytearray(palette)
+        paletted_blocks.bits = bits
+        paletted_blocks.length = length
+        paletted_blocks.data = bytearray(data)
+        return paletted_blocks
+
+    @staticmethod
+    def get_bits(palette_size: int) -> int:
+        bits = 0
+        while (1 << bits) < palette_size:
+            bits = 1 if bits == 0 else bits * 2
+        return bits
+
+    def set_ids(self, blocks_ids: bytes|bytearray) -> None:
+        self.length = len(blocks_ids)
+        self.palette = bytearray(dict.fromkeys(blocks_ids))
+        self.bits = self.get_bits(len(self.palette))
+        self._pack(bytes(blocks_ids).translate(self._get_ids_to_indexes_table()))
+
+    def get_ids(self) -> bytearray:
+        if self.bits == 0:
+            return bytearray(self.palette[:1]) * self.length
+        return bytearray(self._unpack().translate(self._get_indexes_to_ids_table()))
+
+    def get(self, index: int) -> int:
+        if self.bits == 0:
+            return self.palette[0]
+        values_by_byte = 8 // self.bits
+        byte = self.data[index // values_by_byte]
+        return self.palette[(byte >> (index % values_by_byte * self.bits)) & ((1 << self.bits) - 1)]
+
+    def set(self, index: int, id: int) -> None:
+        """Set the id at the given index, adding it to the palette (and using more bits by block if needed)"""
+        if id not in self.palette:
+            self.palette.append(id)
+            bits = self.get_bits(len(self.palette))
+            if bits != self.bits:
+                indexes = self._unpack()
+                self.bits = bits
+                self._pack(indexes)
+        if self.bits == 0: return
+        palette_index = self.palette.index(id)
+        values_by_byte = 8 // self.bits
+        shift = index % values_by_byte * self.bits
+        mask = ((1 << self.bits) - 1) << shift
+        byte_index = index // values_by_byte
+        self.data[byte_index] = (self.data[byte_index] & ~mask) | (palette_index << shift)
+
+    def copy(self) -> 'PalettedBlocks':
+        return PalettedBlocks.from_data(self.palette, self.bits, self.length, self.data)
+
+    def get_size(self) -> int:
+        return len(self.palette) + len(self.data)
+
+    def _get_ids_to_indexes_table(self) -> bytes:
+        table = bytearray(range(256))
+        for index, id in enumerate(self.palette):
+            table[id] = index
+        return bytes(table)
+
+    def _get_indexes_to_ids_table(self) -> bytes:
+        return bytes(self.palette) + bytes(256 - len(self.palette))
+
+    def _pack(self, indexes: bytes) -> None:
+        if self.bits == 0:
+            self.data = bytearray()
+            return
+        if self.bits == 8:
+            self.data = bytearray(indexes)
+            return
+        values_by_byte = 8 // self.bits
+        # pad so the length is a multiple of the number of values by byte
+        indexes += bytes(-len(indexes) % values_by_byte)
+        data = bytearray(len(indexes) // values_by_byte)
+        for i in range(values_by_byte):
+            shift = i * self.bits
+            data = bytearray(byte | (index << shift) for byte, index in zip(data, indexes[i::values_by_byte]))
+        self.data = data
+
+    def _unpack(self) -> bytes:
+        if self.bits == 0:
+            return bytes(self.length)
+        if self.bits == 8:
+            return bytes(self.data)
+        values_by_byte = 8 // self.bits
+        mask = (1 << self.bits) - 1
+        indexes = bytearray(len(self.data) * values_by_byte)
+        for i in range(values_by_byte):
+            shift = i * self.bits
+            indexes[i::values_by_byte] = bytes((byte >> shift) & mask for byte in self.data)
+        return bytes(indexes[:self.length])
@@ -1,8 +1,7 @@
 import pygame
 import blocks
 from conversions_items_blocks import convert_block_to_items, convert_item_to_block
-from map_generation import MapGenerator
-from save_manager_interface import SaveManagerInterface
+from chunk_store import ChunkStore
 from entity import Entity
 from inventory import Inventory
 from player_interface import PlayerInterface
@@ -13,17 +12,16 @@ from gui.ui_element import UIElement
 from time import monotonic
 
 class Player(Entity, PlayerInterface):
-    def __init__(self, name: str, x: int, y: int, speed_x: int, speed_y: int, direction: bool, ui_manager: UIManager, map_generator: MapGenerator, save_manager: SaveManagerInterface, main_inventory_cells: list[tuple[items.Item|None, int]]|None=None, hot_bar_inventory_cells: list[tuple[items.Item|None, int]]|None=None) -> None:
+    def __init__(self, name: str, x: int, y: int, speed_x: int, speed_y: int, direction: bool, ui_manager: UIManager, chunk_store: ChunkStore, main_inventory_cells: list[tuple[items.Item|None, int]]|None=None, hot_bar_inventory_cells: list[tuple[items.Item|None, int]]|None=None) -> None:
         PlayerInterface.__init__(self)
         self.render_distance: int = 1
         self.interaction_range: int = 1 # doesn't work
-        self.save_manager: SaveManagerInterface = save_manager
         self.window = ui_manager.get_window()
         self.infos_font_name: str = ""
         self.infos_font_size: int = 20
         self.infos_font: pygame.font.Font = pygame.font.SysFont(self.infos_font_name, self.infos_font_size)
 
-        Entity.__init__(self, name, x, y, speed_x, speed_y, direction, ui_manager, 1, 2, map_generator, save_manager, 'persos', True)
+        Entity.__init__(self, name, x, y, speed_x, speed_y, direction, ui_manager, 1, 2, chunk_store, 'persos', True)
         self.inventory_size: int = 50
         self.main_inventory: Inventory = Inventory(self.inventory_size - 10, ui_manager, main_inventory_cells, classes_names=['main-inventory'], anchor='center')
         self.hot_bar_inventory: Inventory = Inventory(10, ui_manager, hot_bar_inventory_cells, classes_names=['hot-bar-inventory'], anchor='bottom')
@@ -64,13 +62,17 @@ class Player(Entity, PlayerInterface):
 
     def update(self, delta_t: float) -> bool:
         self.item_clicked_last_frame = False
+        speed_x = self.speed_x
         need_update = super().update(delta_t) \
             or self._dragged_item_index != -1
         self.chunk_manager.update(self.x)
+        if speed_x:
+            # prepare the chunks the player is walking to
+            self.chunk_manager.prefetch(speed_x, 1 if abs(speed_x) <= 1 else 2)
         return need_update
 
     def save(self) -> None:
-        self.chunk_manager.save()
+        self.chunk_manager.chunk_store.save()
     
     def _get_relative_pos(self, x: int, y: int) -> tuple[int, int]:
         x = (x - self.window.get_size()[0] // 2 + blocks.Block.BLOCK_SIZE // 2) // blocks.Block.BLOCK_SIZE
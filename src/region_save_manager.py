@@ -0,0 +1,280 @@
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+from map_chunk import Chunk
+from save_manager import SaveManager, sync_directory
+from chunk_serialization import bytes_to_chunk, RAW
+
+REGION_SIZE = 32 # number of chunks by region file
+MAGIC = b'TGRG'
+# offset, length and capacity of a chunk's slot
+ENTRY = struct.Struct('<III')
+HEADER_SIZE = len(MAGIC) + REGION_SIZE * ENTRY.size
+SLOT_ALIGNMENT = 256 # bytes
+
+
+class RegionFile:
+    def __init__(self, path: str) -> None:
+        """
+        File containing the chunks of REGION_SIZE consecutive ids.
+        The header contains the offset, the length and the capacity of the slot of each chunk (0 if the chunk isn't saved).
+        A chunk is always written in a new slot at the end of the file, and its previous slot is freed by the next compaction (see compact).
+        The file is not buffered, so the writes are immediately visible through its mapping (see read_view).
+        """
+        self.path: str = path
+        self.entries: list[tuple[int, int, int]] = []
+        # mappings of the file, the last one being the current one, kept until no view of them (see read_view) is used anymore
+        self._maps: list[mmap.mmap] = []
+        self._open()
+
+    def _open(self) -> None:
+        if os.path.exists(self.path):
+            self.file = open(self.path, 'r+b', buffering=0)
+            header = self.file.read(HEADER_SIZE)
+            if len(header) != HEADER_SIZE or header[:len(MAGIC)] != MAGIC:
+                raise ValueError(f'{self.path} is not a region file')
+            self.entries = [ENTRY.unpack_from(header, len(MAGIC) + i * ENTRY.size) for i in range(REGION_SIZE)]
+        else:
+            self.file = open(self.path, 'w+b', buffering=0)
+            self.entries = [(0, 0, 0)] * REGION_SIZE
+            self.file.write(MAGIC + b''.join(ENTRY.pack(*entry) for entry in self.entries))
+        self.end: int = self.file.seek(0, os.SEEK_END)
+
+    def read(self, index: int) -> bytes|None:
+        offset, length, _ = self.entries[index]
+        if not offset: return None
+        self.file.seek(offset)
+        return self.file.read(length)
+
+    def read_view(self, index: int) -> memoryview|None:
+        """
+        Return a read-only view of the chunk's data in the mapped file, without copying it.
+        The mapping stays alive as long as a view uses it, even after the file is closed (see close_unused_maps).
+        """
+        offset, length, _ = self.entries[index]
+        if not offset: return None
+        if not self._maps or offset + length > len(self._maps[-1]):
+            # the file grew since it was mapped
+            self.close_unused_maps()
+            self._maps.append(mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ))
+        return memoryview(self._maps[-1])[offset:offset + length]
+
+    def close_unused_maps(self) -> bool:
+        """Close the mappings of the file which aren't used by any view anymore, and return True if none is left"""
+        used_maps = []
+        for file_map in self._maps:
+            try:
+                file_map.close()
+            except BufferError:
+                # a view of the mapping still exists
+                used_maps.append(file_map)
+        self._maps = used_maps
+        return not used_maps
+
+    def write(self, index: int, data: bytes) -> None:
+        """
+        The chunk is appended, so its previous data isn't modified: the views of it (see read_view) don't change,
+        and if the write is interrupted, the header still points to the previous version of the chunk.
+        The header is only updated once the data is written, but without a sync (see sync) between them,
+        the OS could write the header on the disk before the data when the system crashes.
+        """
+        length = len(data)
+        offset = self.end
+        capacity = -(-length // SLOT_ALIGNMENT) * SLOT_ALIGNMENT
+        self.end += capacity
+        self.file.seek(offset)
+        self.file.write(data + bytes(capacity - length))
+        self._set_entry(index, (offset, length, capacity))
+
+    def _set_entry(self, index: int, entry: tuple[int, int, int]) -> None:
+        self.entries[index] = entry
+        self.file.seek(len(MAGIC) + index * ENTRY.size)
+        self.file.write(ENTRY.pack(*entry))
+
+    def get_indexes(self) -> list[int]:
+        return [index for index, entry in enumerate(self.entries) if entry[0]]
+
+    def get_wasted_size(self) -> int:
+        """Number of bytes not used by any chunk's slot"""
+        return self.end - HEADER_SIZE - sum(entry[2] for entry in self.entries if entry[0])
+
+    def compact(self) -> bool:
+        """
+        Rewrite the file without the unused space, and return True if it was compacted.
+        It isn't while views of its chunks (see read_view) are still used, as a mapped file can't be replaced on Windows.
+        """
+        if not self.close_unused_maps(): return False
+        chunks_data = {index: self.read(index) for index in self.get_indexes()}
+        self.close()
+        tmp_path = self.path + '.tmp'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        tmp_region = RegionFile(tmp_path)
+        for index, data in chunks_data.items():
+            tmp_region.write(index, data)
+        tmp_region.sync()
+        tmp_region.close()
+        os.replace(tmp_path, self.path)
+        self._open()
+        return True
+
+    def flush(self) -> None:
+        self.file.flush()
+
+    def sync(self) -> None:
+        """Wait for the file to be on the disk"""
+        os.fsync(self.file.fileno())
+
+    def close(self) -> bool:
+        """
+        Close the file and its unused mappings, and return True if none of its mappings is still used.
+        Those are closed by close_unused_maps, or else unmapped once their last view is deleted.
+        """
+        self.file.close()
+        return self.close_unused_maps()
+
+
+class RegionSaveManager(SaveManager):
+    def __init__(self, save_name: str, write_behind: bool = True, max_pending_chunks: int = 256, chunks_encoding: int = RAW,
+                 max_chunk_edits: int = 256, max_open_regions: int = 16, compaction_min_size: int = 64 * 1024, use_mmap: bool = True) -> None:
+        """
+        Save manager storing the chunks in region files (see RegionFile) instead of one file by chunk.
+        Players and generation infos are saved like in SaveManager.
+        Chunks saved in their own file are still loaded, and moved to their region when saved again.
+        A region file is compacted when its unused space is bigger than compaction_min_size and than its used space,
+        once no loaded chunk uses its mapping anymore (see RegionFile.compact).
+        If use_mmap is True, chunks are read from the mapped region files. The blocks of the chunks saved with the RAW encoding
+        are then not copied until they are modified, so the OS page cache holds the only copy of the unmodified chunks.
+        """
+        self.max_open_regions: int = max_open_regions
+        self.compaction_min_size: int = compaction_min_size
+        self.use_mmap: bool = use_mmap
+        self._regions: OrderedDict[int, RegionFile] = OrderedDict()
+        self._regions_lock: threading.Lock = threading.Lock()
+        # closed regions whose mappings are still used by loaded chunks, so their files can't be compacted yet
+        self._mapped_closed_regions: list[RegionFile] = []
+        # chunks loaded from their own file, guarded by the regions lock (used by the writer and the thread pool)
+        self._file_chunks: set[int] = set()
+        super().__init__(save_name, write_behind, max_pending_chunks, chunks_encoding, max_chunk_edits)
+
+    def _get_region_path(self, region_id: int) -> str:
+        return os.path.join(self.chunks_path, f'{region_id}.region')
+
+    def _get_region(self, region_id: int, create: bool) -> RegionFile|None:
+        """Return the region file, opening it if needed. The regions lock must be acquired"""
+        region = self._regions.get(region_id, None)
+        if region is not None:
+            self._regions.move_to_end(region_id)
+            return region
+        path = self._get_region_path(region_id)
+        if not create and not os.path.exists(path): return None
+        region = RegionFile(path)
+        self._regions[region_id] = region
+        if len(self._regions) > self.max_open_regions:
+            closed_region = self._regions.popitem(last=False)[1]
+            if not closed_region.close():
+                self._mapped_closed_regions.append(closed_region)
+        return region
+
+    def _compact_region(self, region: RegionFile) -> None:
+        """Compact the region file if no mapping of it is used anymore. The regions lock must be acquired"""
+        self._mapped_closed_regions = [closed_region for closed_region in self._mapped_closed_regions if not closed_region.close_unused_maps()]
+        if any(closed_region.path == region.path for closed_region in self._mapped_closed_regions): return
+        region.compact()
+
+    def _read_chunk(self, id: int) -> Chunk|None:
+        with self._regions_lock:
+            region = self._get_region(id // REGION_SIZE, False)
+            if region is None:
+                data = None
+            elif self.use_mmap:
+                data = region.read_view(id % REGION_SIZE)
+            else:
+                data = region.read(id % REGION_SIZE)
+        if data is not None:
+            return bytes_to_chunk(data)
+        chunk = super()._read_chunk(id)
+        if chunk is not None:
+            with self._regions_lock:
+                self._file_chunks.add(id)
+        return chunk
+
+    def _read_chunk_data(self, id: int) -> bytes|None:
+        with self._regions_lock:
+            region = self._get_region(id // REGION_SIZE, False)
+            data = None if region is None else region.read(id % REGION_SIZE)
+        if data is not None: return data
+        return super()._read_chunk_data(id)
+
+    def _get_written_chunk_ids(self) -> set[int]:
+        ids = super()._get_written_chunk_ids()
+        with self._regions_lock:
+            for file in os.listdir(self.chunks_path):
+                if not file.endswith('.region'): continue
+                region_id = int(file.removesuffix('.region'))
+                ids.update(region_id * REGION_SIZE + index for index in self._get_region(region_id, False).get_indexes())
+        return ids
+
+    def get_written_chunk_size(self, id: int) -> int|None:
+        with self._regions_lock:
+            region = self._get_region(id // REGION_SIZE, False)
+            if region is not None and region.entries[id % REGION_SIZE][0]:
+                return region.entries[id % REGION_SIZE][1]
+        return super().get_written_chunk_size(id)
+
+    def _write_chunks(self, chunks: list[Chunk], sync: bool = False) -> None:
+        """The chunks are encoded on the thread pool, and each region file is synced once"""
+        chunks_by_region: dict[int, list[tuple[Chunk, bytes]]] = {}
+        for chunk, data in zip(chunks, self._encode_chunks(chunks)):
+            chunks_by_region.setdefault(chunk.id // REGION_SIZE, []).append((chunk, data))
+        with self._regions_lock:
+            for region_id, region_chunks in chunks_by_region.items():
+                region = self._get_region(region_id, True)
+                for chunk, data in region_chunks:
+                    region.write(chunk.id % REGION_SIZE, data)
+                wasted_size = region.get_wasted_size()
+                if wasted_size > self.compaction_min_size and wasted_size > region.end - HEADER_SIZE - wasted_size:
+                    self._compact_region(region)
+                if sync:
+                    region.sync()
+        with self._regions_lock:
+            file_chunk_ids = [chunk.id for chunk in chunks if chunk.id in self._file_chunks]
+            self._file_chunks.difference_update(file_chunk_ids)
+        for id in file_chunk_ids:
+            for extension in ('.chunk', '.json'):
+                try:
+                    os.remove(os.path.join(self.chunks_path, str(id) + extension))
+                except FileNotFoundError:
+                    pass
+        if sync:
+            sync_directory(self.chunks_path)
+
+    def _write_chunk(self, chunk: Chunk, sync: bool = False) -> None:
+        self._write_chunks([chunk], sync)
+
+    def compact(self) -> None:
+        """Compact every region file whose mapping isn't used by loaded chunks"""
+        self.flush()
+        with self._regions_lock:
+            for file in os.listdir(self.chunks_path):
+                if file.endswith('.region'):
+                    self._compact_region(self._get_region(int(file.removesuffix('.region')), False))
+
+    def flush(self) -> None:
+        super().flush()
+        with self._regions_lock:
+            for region in self._regions.values():
+                region.flush()
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            with self._regions_lock:
+                # the mappings still used are unmapped once the loaded chunks using them are deleted
+                for region in self._regions.values():
+                    region.close()
+                self._regions.clear()
+                self._mapped_closed_regions.clear()
@@ -0,0 +1,87 @@
+import json
+import os
+from typing import Any
+from save_manager import SaveManager, SAVES_PATH
+from region_save_manager import RegionSaveManager
+from sqlite_save_manager import SqliteSaveManager
+
+BACKENDS: dict[str, type[SaveManager]] = {
+    'files': SaveManager,
+    'regions': RegionSaveManager,
+    'sqlite': SqliteSaveManager,
+}
+# backend of the saves created before the backend was saved
+DEFAULT_BACKEND = 'files'
+NEW_SAVES_BACKEND = 'regions'
+
+
+def get_save_infos_path(save_name: str) -> str:
+    return os.path.join(SAVES_PATH, save_name, 'save_infos.json')
+
+
+def load_save_infos(save_name: str) -> dict[str, Any]:
+    try:
+        with open(get_save_infos_path(save_name)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def get_save_backend(save_name: str) -> str:
+    return load_save_infos(save_name).get('backend', DEFAULT_BACKEND)
+
+
+def set_save_infos(save_name: str, backend: str, chunks_encoding: int|None = None) -> None:
+    """chunks_encoding: encoding of the saved chunks (see chunk_serialization), or None for the backend's default one"""
+    os.makedirs(os.path.join(SAVES_PATH, save_name), exist_ok=True)
+    infos: dict[str, Any] = {'backend': backend}
+    if chunks_encoding is not None:
+        infos['chunks_encoding'] = chunks_encoding
+    with open(get_save_infos_path(save_name), 'w') as f:
+        json.dump(infos, f)
+
+
+def get_save_manager(save_name: str, backend: str|None = None, chunks_encoding: int|None = None, **kwargs) -> SaveManager:
+    """
+    Return the save manager of the save, using the backend and the chunks encoding saved with it.
+    If backend is given, it is used and saved instead (for new saves), with chunks_encoding.
+    """
+    if backend is None:
+        infos = load_save_infos(save_name)
+        backend = infos.get('backend', DEFAULT_BACKEND)
+        chunks_encoding = infos.get('chunks_encoding', None)
+    else:
+        set_save_infos(save_name, backend, chunks_encoding)
+    if chunks_encoding is not None:
+        kwargs['chunks_encoding'] = chunks_encoding
+    return BACKENDS[backend](save_name, **kwargs)
+
+
+def convert_save(save_name: str, backend: str, chunks_encoding: int|None = None) -> None:
+    """
+    Copy the chunks, the players and the generation infos of the save to the given backend, and use it for the save.
+    The chunks are saved with chunks_encoding, or the backend's default encoding.
+    The data of the previous backend is kept.
+    """
+    old_save_manager = get_save_manager(save_name, write_behind=False)
+    if backend == get_save_backend(save_name):
+        # only change the chunks encoding
+        new_save_manager = old_save_manager
+        if chunks_encoding is not None:
+            new_save_manager.chunks_encoding = chunks_encoding
+    else:
+        new_save_manager = BACKENDS[backend](save_name, **({} if chunks_encoding is None else {'chunks_encoding': chunks_encoding}))
+    try:
+        # saved first, as the DELTA encoding needs the seed of the random access worlds
+        generation_infos = old_save_manager.load_generation_infos()
+        if generation_infos is not None:
+            new_save_manager.save_generation_infos(generation_infos)
+        for id in sorted(old_save_manager.get_chunk_ids()):
+            new_save_manager.save_chunk(old_save_manager.load_chunk(id))
+        for name, player_infos in old_save_manager._load_players_infos().items():
+            new_save_manager._save_player_infos(name, player_infos)
+    finally:
+        new_save_manager.close()
+        if old_save_manager is not new_save_manager:
+            old_save_manager.close()
+    set_save_infos(save_name, backend, chunks_encoding)
@@ -0,0 +1,145 @@
+import json
+import os
+import shutil
+import threading
+from time import time
+from typing import Any
+from save_manager import SAVES_PATH
+from save_backends import get_save_backend
+
+METADATA_NAME = 'metadata.json'
+CATALOG_NAME = 'catalog.json'
+# the deleted saves are moved there, and removed by a background thread
+DELETED_SAVES_DIRECTORY = '.deleted'
+
+
+def get_metadata_path(save_name: str) -> str:
+    return os.path.join(SAVES_PATH, save_name, METADATA_NAME)
+
+
+def get_directory_size(path: str) -> int:
+    size = 0
+    for entry in os.scandir(path):
+        if entry.is_dir(follow_symlinks=False):
+            size += get_directory_size(entry.path)
+        else:
+            size += entry.stat(follow_symlinks=False).st_size
+    return size
+
+
+def _write_json(path: str, data: Any) -> None:
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def load_save_metadata(save_name: str) -> dict[str, Any]|None:
+    try:
+        with open(get_metadata_path(save_name)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _create_save_metadata(save_name: str) -> dict[str, Any]:
+    """Metadata of a save written before the metadata existed, or whose metadata is lost"""
+    save_path = os.path.join(SAVES_PATH, save_name)
+    return {
+        'seed': None,
+        'nb_chunks': None,
+        'size': get_directory_size(save_path),
+        'created': None,
+        'last_played': os.path.getmtime(save_path),
+        'backend': get_save_backend(save_name),
+    }
+
+
+def update_save_metadata(save_name: str, seed: str|None = None, nb_chunks: int|None = None, played: bool = True) -> dict[str, Any]:
+    """
+    Write the metadata of the save (seed, number of chunks, size, creation and last played times, backend)
+    and put it in the catalog. Called when the save is written, so the size is measured there and not when listing the saves.
+    If played is False (the save was only converted or cleaned), the last played time is kept.
+    """
+    metadata = load_save_metadata(save_name) or {}
+    now = time()
+    metadata.update({
+        'seed': seed if seed is not None else metadata.get('seed', None),
+        'nb_chunks': nb_chunks if nb_chunks is not None else metadata.get('nb_chunks', None),
+        'size': get_directory_size(os.path.join(SAVES_PATH, save_name)),
+        'created': metadata.get('created', None) or now,
+        'last_played': now if played else metadata.get('last_played', None) or os.path.getmtime(os.path.join(SAVES_PATH, save_name)),
+        'backend': get_save_backend(save_name),
+    })
+    _write_json(get_metadata_path(save_name), metadata)
+    catalog = _read_catalog()
+    catalog[save_name] = metadata
+    _write_json(os.path.join(SAVES_PATH, CATALOG_NAME), catalog)
+    return metadata
+
+
+def _read_catalog() -> dict[str, dict[str, Any]]:
+    try:
+        with open(os.path.join(SAVES_PATH, CATALOG_NAME)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _list_save_names() -> list[str]:
+    if not os.path.isdir(SAVES_PATH): return []
+    return [entry.name for entry in os.scandir(SAVES_PATH) if entry.is_dir() and not entry.name.startswith('.')]
+
+
+def load_catalog() -> dict[str, dict[str, Any]]:
+    """
+    Return the metadata of every save, by name, from the catalog (SAVES_PATH/catalog.json).
+    Only the saves missing from the catalog (created by a previous version, or copied in the saves directory)
+    have their metadata file read, or created by walking their directory, and the catalog is then updated.
+    """
+    catalog = _read_catalog()
+    save_names = _list_save_names()
+    is_modified = len(catalog) != len(save_names) or not all(name in catalog for name in save_names)
+    if not is_modified: return catalog
+    catalog = {name: catalog.get(name, None) or load_save_metadata(name) or _create_save_metadata(name) for name in save_names}
+    _write_json(os.path.join(SAVES_PATH, CATALOG_NAME), catalog)
+    return catalog
+
+
+def get_sorted_save_names(catalog: dict[str, dict[str, Any]]) -> list[str]:
+    """Return the names of the saves, from the last played one"""
+    return sorted(catalog, key=lambda name: (-(catalog[name].get('last_played', None) or 0), name))
+
+
+def _remove_directories(paths: list[str]) -> None:
+    for path in paths:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def delete_save(save_name: str) -> None:
+    """
+    Remove the save from the catalog and move it to the deleted saves directory, which is fast,
+    and remove its files in a background thread.
+    The saves deleted by a game which stopped before removing them are removed by remove_deleted_saves.
+    """
+    save_path = os.path.join(SAVES_PATH, save_name)
+    catalog = _read_catalog()
+    if catalog.pop(save_name, None) is not None:
+        _write_json(os.path.join(SAVES_PATH, CATALOG_NAME), catalog)
+    if not os.path.exists(save_path): return
+    deleted_saves_path = os.path.join(SAVES_PATH, DELETED_SAVES_DIRECTORY)
+    os.makedirs(deleted_saves_path, exist_ok=True)
+    # a save with the same name could already be waiting to be removed
+    deleted_path = os.path.join(deleted_saves_path, f'{save_name}.{time():.6f}')
+    os.rename(save_path, deleted_path)
+    threading.Thread(target=_remove_directories, args=([deleted_path],), daemon=True).start()
+
+
+def remove_deleted_saves() -> None:
+    """Remove, in a background thread, the deleted saves which are still in the deleted saves directory"""
+    deleted_saves_path = os.path.join(SAVES_PATH, DELETED_SAVES_DIRECTORY)
+    if not os.path.isdir(deleted_saves_path): return
+    # the directory itself is kept, a save could be moved in it while the others are removed
+    deleted_paths = [entry.path for entry in os.scandir(deleted_saves_path)]
+    if not deleted_paths: return
+    threading.Thread(target=_remove_directories, args=(deleted_paths,), daemon=True).start()
@@ -1,22 +1,80 @@
-from map_chunk import Chunk, blocks_to_int, int_to_blocks
+from map_chunk import Chunk
+import blocks
 import json
+import logging
 import os
-from biomes import BIOMES, get_biome_environment_values
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from biomes import BIOMES
 from player_interface import PlayerInterface
 from save_manager_interface import SaveManagerInterface
 from typing import Any
 from inventory import inventory_cells_to_ints, ints_to_inventory_cells
 from module_infos import MODULE_PATH
+from chunk_serialization import chunk_to_bytes, bytes_to_chunk, get_encoding, ZLIB, DELTA
+from edit_journal import EditJournal
 
 SAVES_PATH: str = os.path.join(MODULE_PATH, 'saves')
 
 FIRST_VERSIONNED_VERSION = 0.3
-VERSION = 0.3
+VERSION = 0.4
+# seconds before the writer tries again to write chunks it failed to write
+WRITE_RETRY_DELAY = 1
+
+logger = logging.getLogger(__name__)
+
+def sync_directory(path: str) -> None:
+    """Wait for the files creations and deletions in the directory to be on the disk (not possible, nor needed, on Windows)"""
+    if os.name == 'nt': return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
 
 class SaveManager(SaveManagerInterface):
-    def __init__(self, save_name: str) -> None:
+    def __init__(self, save_name: str, write_behind: bool = True, max_pending_chunks: int = 256, chunks_encoding: int = ZLIB, max_chunk_edits: int = 256) -> None:
+        """
+        If write_behind is True, save_chunk only copies the chunk, and a background thread writes it.
+        A chunk saved again before being written is only written once.
+        When max_pending_chunks chunks are waiting to be written, save_chunk waits for the writer.
+        If the writer fails to write chunks, it logs the error and tries again with the next chunks every WRITE_RETRY_DELAY seconds,
+        and save_chunk (with a full queue), flush and close raise the error instead of waiting.
+        Chunks are saved in the binary format of chunk_serialization, with the given encoding for the blocks.
+        With the DELTA encoding, only the blocks which differ from the generated ones are saved,
+        the chunks of a random access world being generated again from its seed if they have no generation state,
+        and loading a chunk which isn't generated anymore as when it was saved raises a ValueError (see world_tool validate).
+        Chunks saved as json by previous versions are still loaded, and replaced by binary files when saved again.
+        The blocks set in saved chunks are appended to an edit journal (see EditJournal and record_edit),
+        so the chunks only need to be written again after max_chunk_edits edits.
+        load_chunks and save_chunks decode and encode several chunks at once on a thread pool.
+        """
         self.save_name = save_name
+        self.chunks_encoding: int = chunks_encoding
+        # chunks loaded from a json file, guarded by its lock (used by the thread pool and the writer)
+        self._json_chunks: set[int] = set()
+        self._json_chunks_lock: threading.Lock = threading.Lock()
+        # seed of the world if it uses the random access generation, None if it doesn't or isn't known yet (see _get_random_access_seed)
+        self._random_access_seed: str|None = None
+        self._generation_infos_checked: bool = False
         self.init_repository()
+        self.journal: EditJournal = EditJournal(os.path.join(SAVES_PATH, self.save_name, 'journal.bin'))
+        self.max_chunk_edits: int = max_chunk_edits
+        self.max_pending_chunks: int = max_pending_chunks
+        # chunks waiting to be written, with the sequence number of the journal when they were saved
+        self._pending_chunks: dict[int, tuple[Chunk, int]] = {}
+        # chunks being written together by the writer
+        self._writing_chunks: dict[int, tuple[Chunk, int]] = {}
+        # chunks being written by save_chunks
+        self._syncing_chunks: dict[int, tuple[Chunk, int]] = {}
+        self._writer_condition: threading.Condition = threading.Condition()
+        # error of the last write of the writer, whose chunks are written again until it succeeds
+        self._write_error: Exception|None = None
+        self._writer: threading.Thread|None = None
+        self._pool: ThreadPoolExecutor|None = None
+        if write_behind:
+            self._writer = threading.Thread(target=self._write_loop, daemon=True)
+            self._writer.start()
 
     def init_repository(self) -> None:
         self.chunks_path = os.path.join(SAVES_PATH, self.save_name, 'chunks')
@@ -26,46 +84,293 @@ class SaveManager(SaveManagerInterface):
         os.makedirs(self.players_path, exist_ok=True)
 
     def load_chunk(self, id: int) -> Chunk|None:
+        with self._writer_condition:
+            # the file could be outdated
+            pending_chunk = self._pending_chunks.get(id, None)
+            if pending_chunk is None:
+                pending_chunk = self._writing_chunks.get(id, None)
+            if pending_chunk is None:
+                pending_chunk = self._syncing_chunks.get(id, None)
+            if pending_chunk is not None:
+                chunk = pending_chunk[0].copy()
+                chunk.is_modified = False
+                edits = self.journal.get_edits(id, pending_chunk[1])
+            else:
+                edits = self.journal.get_edits(id)
+        if pending_chunk is None:
+            chunk = self._read_chunk(id)
+            if chunk is None: return None
+        for x, y, block_id in edits:
+            chunk.set_block(x, y, blocks.REVERSED_BLOCKS_DICT[block_id])
+        if edits:
+            chunk.compact()
+        chunk.is_saved = True
+        return chunk
+
+    def load_chunks(self, ids: list[int]) -> dict[int, Chunk|None]:
+        """Load several chunks at once, reading and decoding them on the thread pool"""
+        if len(ids) < 2:
+            return {id: self.load_chunk(id) for id in ids}
+        return dict(zip(ids, self._get_pool().map(self.load_chunk, ids)))
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(os.cpu_count(), thread_name_prefix='save_manager')
+        return self._pool
+
+    def get_chunk_data(self, id: int) -> bytes|None:
+        """
+        Return the chunk in the binary format of chunk_serialization, with its edits from the journal, or None if it isn't saved.
+        The written data is returned without decoding it if the chunk has no edits and isn't waiting to be written.
+        """
+        with self._writer_condition:
+            is_outdated = id in self._pending_chunks or id in self._writing_chunks or id in self._syncing_chunks or id in self.journal.edits
+            # the chunk can't start to be written while the condition is acquired
+            data = None if is_outdated else self._read_chunk_data(id)
+        if data is not None: return data
+        chunk = self.load_chunk(id)
+        if chunk is None: return None
+        return self._chunk_to_bytes(chunk)
+
+    def _read_chunk_data(self, id: int) -> bytes|None:
+        """Return the written data of the chunk, or None if it isn't written in the binary format"""
+        try:
+            with open(os.path.join(self.chunks_path, str(id) + '.chunk'), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _read_chunk(self, id: int) -> Chunk|None:
+        data = self._read_chunk_data(id)
+        if data is None:
+            return self._load_json_chunk(id)
+        return bytes_to_chunk(data)
+
+    def _load_json_chunk(self, id: int) -> Chunk|None:
+        """
+        Load a chunk saved as json by the versions before 0.4.
+        It is loaded whatever the version of the save, whose json chunks are only replaced when they are saved again.
+        """
         try:
             with open(os.path.join(self.chunks_path, str(id) + '.json')) as f:
                 chunk_dict = json.load(f)
         except FileNotFoundError:
             return None
+        with self._json_chunks_lock:
+            self._json_chunks.add(id)
         version = chunk_dict.get('version', 0)
         # handle different versions
-        chunk: Chunk = Chunk(id, chunk_dict['direction'], BIOMES[tuple(chunk_dict['biome'])])
+        chunk: Chunk = Chunk(id, chunk_dict['direction'], BIOMES[tuple(chunk_dict['biome'])], bytearray(chunk_dict['blocks']))
         chunk.is_forest = chunk_dict['is_forest']
-        chunk.blocks = int_to_blocks(chunk_dict['blocks'])
         return chunk
 
+    def get_chunk_ids(self) -> set[int]:
+        """Return the ids of the saved chunks"""
+        with self._writer_condition:
+            ids = set(self._pending_chunks) | set(self._writing_chunks) | set(self.journal.edits)
+        ids.update(self._get_written_chunk_ids())
+        return ids
+
+    def _get_written_chunk_ids(self) -> set[int]:
+        return {int(file.split('.')[0]) for file in os.listdir(self.chunks_path) if file.endswith(('.chunk', '.json'))}
+
+    def get_written_chunk_size(self, id: int) -> int|None:
+        """Return the number of bytes used by the written chunk (without its edits in the journal), or None if it isn't written"""
+        for extension in ('.chunk', '.json'):
+            try:
+                return os.path.getsize(os.path.join(self.chunks_path, str(id) + extension))
+            except FileNotFoundError:
+                pass
+        return None
+
+    def get_written_chunk_encoding(self, id: int) -> int|None:
+        """Return the encoding the chunk is written with (see chunk_serialization), or None if it isn't written in the binary format"""
+        data = self._read_chunk_data(id)
+        if data is None: return None
+        return get_encoding(data)
+
     def save_chunk(self, chunk: Chunk|None) -> None:
         if chunk is None: return
-        chunk_dict = {
-            'direction': chunk.direction,
-            'biome': get_biome_environment_values(chunk.biome),
-            'is_forest': chunk.is_forest,
-            'blocks': blocks_to_int(chunk.blocks),
-            'version': VERSION
-        }
-        with open(os.path.join(self.chunks_path, str(chunk.id) + '.json'), 'w') as f:
-            json.dump(chunk_dict, f)
+        if self._writer is None:
+            seq = self.journal.get_seq()
+            self._write_chunks([chunk])
+            self.journal.checkpoint(chunk.id, seq)
+            return
+        with self._writer_condition:
+            while len(self._pending_chunks) >= self.max_pending_chunks and chunk.id not in self._pending_chunks:
+                self._raise_write_error()
+                self._writer_condition.wait()
+            self._pending_chunks[chunk.id] = (chunk.copy(), self.journal.get_seq())
+            self._writer_condition.notify_all()
+
+    def save_chunks(self, chunks: list[Chunk]) -> None:
+        """
+        Write several chunks at once, without the writer, and wait for them to be on the disk.
+        They are encoded and written on the thread pool, and synced to the disk together.
+        """
+        if not chunks: return
+        with self._writer_condition:
+            while True:
+                # the waiting copies of these chunks are outdated (the writer puts back the chunks it failed to write)
+                for chunk in chunks:
+                    self._pending_chunks.pop(chunk.id, None)
+                self._writer_condition.notify_all()
+                if not any(chunk.id in self._writing_chunks for chunk in chunks): break
+                self._writer_condition.wait()
+            seq = self.journal.get_seq()
+            for chunk in chunks:
+                self._syncing_chunks[chunk.id] = (chunk, seq)
+        try:
+            self._write_chunks(chunks, True)
+            with self._writer_condition:
+                for chunk in chunks:
+                    self.journal.checkpoint(chunk.id, seq)
+        finally:
+            with self._writer_condition:
+                for chunk in chunks:
+                    self._syncing_chunks.pop(chunk.id, None)
+                self._writer_condition.notify_all()
+
+    def record_edit(self, id: int, x: int, y: int, block_id: int) -> bool:
+        """
+        Append the block set in the saved chunk to the journal, instead of writing the chunk again.
+        Return True if the chunk has too many edits in the journal and should be saved.
+        """
+        with self._writer_condition:
+            return self.journal.append(id, x, y, block_id) >= self.max_chunk_edits
+
+    def _write_loop(self) -> None:
+        while True:
+            with self._writer_condition:
+                while not self._pending_chunks and self._writer is not None:
+                    self._writer_condition.wait()
+                if not self._pending_chunks: return
+                # write every waiting chunk together
+                self._writing_chunks, self._pending_chunks = self._pending_chunks, {}
+                self._writer_condition.notify_all()
+            error = None
+            try:
+                self._write_chunks([chunk for chunk, _ in self._writing_chunks.values()])
+                with self._writer_condition:
+                    for chunk, seq in self._writing_chunks.values():
+                        self.journal.checkpoint(chunk.id, seq)
+            except Exception as e:
+                logger.exception('Failed to write %d chunks of the save %s', len(self._writing_chunks), self.save_name)
+                error = e
+            with self._writer_condition:
+                if error is not None:
+                    # write them again with the next chunks, unless they were saved again meanwhile
+                    for id, pending_chunk in self._writing_chunks.items():
+                        self._pending_chunks.setdefault(id, pending_chunk)
+                self._write_error = error
+                self._writing_chunks = {}
+                self._writer_condition.notify_all()
+                if error is not None:
+                    # closing, close raises the error
+                    if self._writer is None: return
+                    self._writer_condition.wait(WRITE_RETRY_DELAY)
+
+    def _raise_write_error(self) -> None:
+        """Must be called with the writer's condition acquired"""
+        if self._write_error is not None:
+            raise OSError(f'The chunks of the save {self.save_name} could not be written') from self._write_error
+
+    def flush(self) -> None:
+        """Wait until every saved chunk is written, or raise the writer's error if it fails to write them"""
+        with self._writer_condition:
+            while self._pending_chunks or self._writing_chunks:
+                self._raise_write_error()
+                self._writer_condition.wait()
+
+    def close(self) -> None:
+        """
+        Write the remaining chunks, stop the writer and close the journal.
+        If the writer fails to write the remaining chunks, raise its error once everything is closed.
+        """
+        writer = self._writer
+        if writer is not None:
+            with self._writer_condition:
+                self._writer = None
+                self._writer_condition.notify_all()
+            writer.join()
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        self.journal.close()
+        with self._writer_condition:
+            if self._pending_chunks:
+                self._raise_write_error()
+
+    def _get_random_access_seed(self) -> str|None:
+        """Return the seed of the world if it uses the random access generation, once its generation infos are saved"""
+        if not self._generation_infos_checked:
+            infos = self.load_generation_infos()
+            if infos is not None:
+                self._random_access_seed = infos['seed'] if infos.get('random_access', False) else None
+                self._generation_infos_checked = True
+        return self._random_access_seed
+
+    def _chunk_to_bytes(self, chunk: Chunk) -> bytes:
+        """Encode the chunk with the save's encoding (see chunk_to_bytes)"""
+        random_access_seed = self._get_random_access_seed() if self.chunks_encoding == DELTA and chunk.generation_state is None else None
+        return chunk_to_bytes(chunk, self.chunks_encoding, random_access_seed)
+
+    def _encode_chunks(self, chunks: list[Chunk]) -> list[bytes]:
+        """Encode the chunks, on the thread pool if there are several of them"""
+        if len(chunks) < 2:
+            return [self._chunk_to_bytes(chunk) for chunk in chunks]
+        return list(self._get_pool().map(self._chunk_to_bytes, chunks))
+
+    def _write_chunks(self, chunks: list[Chunk], sync: bool = False) -> None:
+        """
+        Designed to be overriden, to write several chunks at once.
+        If sync is True, wait for the chunks to be on the disk.
+        """
+        if len(chunks) < 2:
+            for chunk in chunks:
+                self._write_chunk(chunk, sync)
+        else:
+            list(self._get_pool().map(self._write_chunk, chunks, [sync] * len(chunks)))
+        if sync:
+            sync_directory(self.chunks_path)
+
+    def _write_chunk(self, chunk: Chunk, sync: bool = False) -> None:
+        with open(os.path.join(self.chunks_path, str(chunk.id) + '.chunk'), 'wb') as f:
+            f.write(self._chunk_to_bytes(chunk))
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        with self._json_chunks_lock:
+            is_json_chunk = chunk.id in self._json_chunks
+            self._json_chunks.discard(chunk.id)
+        if is_json_chunk:
+            try:
+                os.remove(os.path.join(self.chunks_path, str(chunk.id) + '.json'))
+            except FileNotFoundError:
+                pass
     
     def load_players(self) -> dict[str, dict[str, Any]]|None:
+        players: dict[str, dict[str, Any]] = {}
+        for name, player_infos in self._load_players_infos().items():
+            version = player_infos.get('version', 0)
+            # handle versions
+            if version < FIRST_VERSIONNED_VERSION:
+                player_infos['hot_bar_inventory'] = player_infos['inventory'][:10]
+                player_infos['main_inventory'] = player_infos['inventory'][10:]
+                player_infos.pop('inventory')
+
+            player_infos['hot_bar_inventory'] = ints_to_inventory_cells(player_infos['hot_bar_inventory'])
+            player_infos['main_inventory'] = ints_to_inventory_cells(player_infos['main_inventory'])
+            players[name] = player_infos
+        return players
+
+    def _load_players_infos(self) -> dict[str, dict[str, Any]]:
+        """Return the saved infos of each player, as they were saved"""
         players: dict[str, dict[str, Any]] = {}
         for player_file in os.listdir(self.players_path):
             try:
                 with open(os.path.join(self.players_path, player_file)) as f:
-                    player_infos = json.load(f)
-                version = player_infos.get('version', 0)
-                # handle versions
-                if version < FIRST_VERSIONNED_VERSION:
-                    player_infos['hot_bar_inventory'] = player_infos['inventory'][:10]
-                    player_infos['main_inventory'] = player_infos['inventory'][10:]
-                    player_infos.pop('inventory')
-
-                player_infos['hot_bar_inventory'] = ints_to_inventory_cells(player_infos['hot_bar_inventory'])
-                player_infos['main_inventory'] = ints_to_inventory_cells(player_infos['main_inventory'])
-                players[player_file.removesuffix('.json')] = player_infos
+                    players[player_file.removesuffix('.json')] = json.load(f)
             except FileNotFoundError:
                 pass
         return players
@@ -82,8 +387,11 @@ class SaveManager(SaveManagerInterface):
                 'main_inventory': inventory_cells_to_ints(player.main_inventory.cells),
                 'version': VERSION
             }
-            with open(os.path.join(self.players_path, player.name + '.json'), 'w') as f:
-                json.dump(player_dict, f)
+            self._save_player_infos(player.name, player_dict)
+
+    def _save_player_infos(self, name: str, player_infos: dict[str, Any]) -> None:
+        with open(os.path.join(self.players_path, name + '.json'), 'w') as f:
+            json.dump(player_infos, f)
 
     def load_generation_infos(self) -> dict[str, Any]|None:
         try:
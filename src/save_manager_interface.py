@@ -11,10 +11,30 @@ class SaveManagerInterface(metaclass=ABCMeta):
     def load_chunk(self, id: int) -> Chunk|None:
         pass
 
+    @abstractmethod
+    def load_chunks(self, ids: list[int]) -> dict[int, Chunk|None]:
+        pass
+
     @abstractmethod
     def save_chunk(self, chunk: Chunk|None) -> None:
         pass
 
+    @abstractmethod
+    def save_chunks(self, chunks: list[Chunk]) -> None:
+        pass
+
+    @abstractmethod
+    def record_edit(self, id: int, x: int, y: int, block_id: int) -> bool:
+        pass
+
+    @abstractmethod
+    def flush(self) -> None:
+        pass
+
+    @abstractmethod
+    def close(self) -> None:
+        pass
+
     @abstractmethod
     def load_players(self) -> list[PlayerInterface]|None:
         pass
@@ -0,0 +1,99 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Any
+from map_chunk import Chunk
+from save_manager import SaveManager, SAVES_PATH, VERSION
+from chunk_serialization import bytes_to_chunk, ZLIB
+
+DATABASE_NAME = 'world.db'
+
+
+class SqliteSaveManager(SaveManager):
+    def __init__(self, save_name: str, write_behind: bool = True, max_pending_chunks: int = 256, chunks_encoding: int = ZLIB, max_chunk_edits: int = 256) -> None:
+        """
+        Save manager storing the chunks (in the binary format of chunk_serialization), the players and the generation infos
+        in a single SQLite database by world, using the WAL journal mode.
+        The chunks waiting to be written by the writer are written in a single transaction.
+        Reads use their own connection, so they don't wait for the writes.
+        """
+        self._write_lock: threading.Lock = threading.Lock()
+        self._read_lock: threading.Lock = threading.Lock()
+        super().__init__(save_name, write_behind, max_pending_chunks, chunks_encoding, max_chunk_edits)
+
+    def init_repository(self) -> None:
+        save_path = os.path.join(SAVES_PATH, self.save_name)
+        os.makedirs(save_path, exist_ok=True)
+        self.database_path = os.path.join(save_path, DATABASE_NAME)
+        # used by the writer thread, and by the caller's thread
+        self._write_connection: sqlite3.Connection = sqlite3.connect(self.database_path, check_same_thread=False)
+        self._write_connection.execute('PRAGMA journal_mode=WAL')
+        self._write_connection.execute('PRAGMA synchronous=NORMAL')
+        with self._write_connection:
+            self._write_connection.execute('CREATE TABLE IF NOT EXISTS chunks (id INTEGER PRIMARY KEY, data BLOB NOT NULL)')
+            self._write_connection.execute('CREATE TABLE IF NOT EXISTS players (name TEXT PRIMARY KEY, infos TEXT NOT NULL)')
+            self._write_connection.execute('CREATE TABLE IF NOT EXISTS infos (name TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        self._read_connection: sqlite3.Connection = sqlite3.connect(self.database_path, check_same_thread=False)
+
+    def _read_chunk_data(self, id: int) -> bytes|None:
+        with self._read_lock:
+            row = self._read_connection.execute('SELECT data FROM chunks WHERE id = ?', (id,)).fetchone()
+        if row is None: return None
+        return row[0]
+
+    def _read_chunk(self, id: int) -> Chunk|None:
+        data = self._read_chunk_data(id)
+        if data is None: return None
+        return bytes_to_chunk(data)
+
+    def _get_written_chunk_ids(self) -> set[int]:
+        with self._read_lock:
+            return {row[0] for row in self._read_connection.execute('SELECT id FROM chunks')}
+
+    def get_written_chunk_size(self, id: int) -> int|None:
+        with self._read_lock:
+            row = self._read_connection.execute('SELECT length(data) FROM chunks WHERE id = ?', (id,)).fetchone()
+        if row is None: return None
+        return row[0]
+
+    def _write_chunks(self, chunks: list[Chunk], sync: bool = False) -> None:
+        """The chunks are encoded on the thread pool, and written in a single transaction"""
+        rows = [(chunk.id, data) for chunk, data in zip(chunks, self._encode_chunks(chunks))]
+        with self._write_lock:
+            with self._write_connection:
+                self._write_connection.executemany('INSERT OR REPLACE INTO chunks (id, data) VALUES (?, ?)', rows)
+            if sync:
+                # the commits aren't synced in the WAL mode with synchronous=NORMAL, a checkpoint syncs the database
+                self._write_connection.execute('PRAGMA wal_checkpoint(FULL)')
+
+    def _write_chunk(self, chunk: Chunk, sync: bool = False) -> None:
+        self._write_chunks([chunk], sync)
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            with self._read_lock:
+                self._read_connection.close()
+            with self._write_lock:
+                self._write_connection.close()
+
+    def _load_players_infos(self) -> dict[str, dict[str, Any]]:
+        with self._read_lock:
+            return {name: json.loads(infos) for name, infos in self._read_connection.execute('SELECT name, infos FROM players')}
+
+    def _save_player_infos(self, name: str, player_infos: dict[str, Any]) -> None:
+        with self._write_lock, self._write_connection:
+            self._write_connection.execute('INSERT OR REPLACE INTO players (name, infos) VALUES (?, ?)', (name, json.dumps(player_infos)))
+
+    def load_generation_infos(self) -> dict[str, Any]|None:
+        with self._read_lock:
+            row = self._read_connection.execute("SELECT value FROM infos WHERE name = 'generation_infos'").fetchone()
+        if row is None: return
+        return json.loads(row[0])
+
+    def save_generation_infos(self, infos: dict[str, Any]) -> None:
+        infos['version'] = VERSION
+        with self._write_lock, self._write_connection:
+            self._write_connection.execute("INSERT OR REPLACE INTO infos (name, value) VALUES ('generation_infos', ?)", (json.dumps(infos),))
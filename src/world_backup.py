@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import zlib
+from time import time, strftime, localtime
+from typing import Any
+from chunk_serialization import bytes_to_chunk
+from save_manager import SaveManager, SAVES_PATH, VERSION
+from save_backends import get_save_backend, get_save_manager, load_save_infos
+from save_catalog import delete_save, update_save_metadata
+
+# the backups of every save, which stay when the save is deleted
+BACKUPS_DIRECTORY = '.backups'
+# number of chunks restored together
+RESTORE_BATCH_SIZE = 256
+
+
+def get_backups_path(save_name: str) -> str:
+    return os.path.join(SAVES_PATH, BACKUPS_DIRECTORY, save_name)
+
+
+def get_object_path(backups_path: str, chunk_hash: str) -> str:
+    return os.path.join(backups_path, 'objects', chunk_hash[:2], chunk_hash)
+
+
+def get_snapshot_path(backups_path: str, snapshot_name: str) -> str:
+    return os.path.join(backups_path, 'snapshots', snapshot_name + '.json')
+
+
+def hash_data(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _get_object_hashes(backups_path: str) -> set[str]:
+    objects_path = os.path.join(backups_path, 'objects')
+    if not os.path.isdir(objects_path): return set()
+    return {entry.name for directory in os.scandir(objects_path) if directory.is_dir() for entry in os.scandir(directory.path) if not entry.name.endswith('.tmp')}
+
+
+def _write_object(backups_path: str, chunk_hash: str, data: bytes) -> int:
+    """Write the data, compressed, and return the number of written bytes"""
+    path = get_object_path(backups_path, chunk_hash)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    compressed_data = zlib.compress(data, 1)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(compressed_data)
+    os.replace(tmp_path, path)
+    return len(compressed_data)
+
+
+def _read_object(backups_path: str, chunk_hash: str) -> bytes:
+    with open(get_object_path(backups_path, chunk_hash), 'rb') as f:
+        data = zlib.decompress(f.read())
+    if hash_data(data) != chunk_hash:
+        raise ValueError(f'Backup object {chunk_hash} is corrupted')
+    return data
+
+
+def create_snapshot(save_manager: SaveManager) -> dict[str, Any]:
+    """
+    Back up the saved chunks, players and generation infos of the save, and return the snapshot's manifest.
+    Each chunk is stored once by content (with the hash of its binary data), so only the chunks which changed since
+    the previous snapshots are copied, and a snapshot only writes its manifest: the hash of every chunk.
+    The chunks' data is read from the save manager (see SaveManager.get_chunk_data), so it works with every backend,
+    and can be done in a thread while the game uses the save manager. Chunks modified in the game and not saved yet aren't in the snapshot.
+    """
+    start = time()
+    save_name = save_manager.save_name
+    backups_path = get_backups_path(save_name)
+    known_hashes = _get_object_hashes(backups_path)
+    chunks: dict[str, str] = {}
+    nb_new_chunks = 0
+    new_size = 0
+    for id in sorted(save_manager.get_chunk_ids()):
+        data = save_manager.get_chunk_data(id)
+        if data is None: continue
+        chunk_hash = hash_data(data)
+        chunks[str(id)] = chunk_hash
+        if chunk_hash in known_hashes: continue
+        new_size += _write_object(backups_path, chunk_hash, data)
+        known_hashes.add(chunk_hash)
+        nb_new_chunks += 1
+    manifest = {
+        'version': VERSION,
+        'save_name': save_name,
+        'created': start,
+        'backend': get_save_backend(save_name),
+        'chunks_encoding': load_save_infos(save_name).get('chunks_encoding', None),
+        'chunks': chunks,
+        'players': save_manager._load_players_infos(),
+        'generation_infos': save_manager.load_generation_infos(),
+        'nb_new_chunks': nb_new_chunks,
+        'new_size': new_size,
+    }
+    snapshot_name = strftime('%Y-%m-%d_%H-%M-%S', localtime(start))
+    snapshot_path = get_snapshot_path(backups_path, snapshot_name)
+    # several snapshots in the same second
+    index = 1
+    while os.path.exists(snapshot_path):
+        index += 1
+        snapshot_path = get_snapshot_path(backups_path, f'{snapshot_name}_{index}')
+    os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+    # the manifest is written last, so a snapshot interrupted before the end doesn't exist
+    tmp_path = snapshot_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, snapshot_path)
+    manifest['name'] = os.path.basename(snapshot_path).removesuffix('.json')
+    return manifest
+
+
+def start_snapshot(save_manager: SaveManager) -> threading.Thread:
+    """Create a snapshot in a thread, which must be joined before closing the save manager"""
+    thread = threading.Thread(target=create_snapshot, args=(save_manager,), name='backup', daemon=True)
+    thread.start()
+    return thread
+
+
+def get_snapshot_names(save_name: str) -> list[str]:
+    """Return the names of the save's snapshots, from the oldest one"""
+    snapshots_path = os.path.join(get_backups_path(save_name), 'snapshots')
+    if not os.path.isdir(snapshots_path): return []
+    return sorted((file.removesuffix('.json') for file in os.listdir(snapshots_path) if file.endswith('.json')), key=lambda name: os.path.getmtime(os.path.join(snapshots_path, name + '.json')))
+
+
+def load_snapshot(save_name: str, snapshot_name: str) -> dict[str, Any]:
+    with open(get_snapshot_path(get_backups_path(save_name), snapshot_name)) as f:
+        manifest = json.load(f)
+    manifest['name'] = snapshot_name
+    return manifest
+
+
+def remove_snapshot(save_name: str, snapshot_name: str) -> None:
+    """Remove the snapshot and the chunks which aren't used by the other snapshots"""
+    backups_path = get_backups_path(save_name)
+    os.remove(get_snapshot_path(backups_path, snapshot_name))
+    used_hashes: set[str] = set()
+    for name in get_snapshot_names(save_name):
+        used_hashes.update(load_snapshot(save_name, name)['chunks'].values())
+    for chunk_hash in _get_object_hashes(backups_path) - used_hashes:
+        os.remove(get_object_path(backups_path, chunk_hash))
+
+
+def remove_old_snapshots(save_name: str, max_snapshots: int) -> None:
+    for snapshot_name in get_snapshot_names(save_name)[:-max_snapshots]:
+        remove_snapshot(save_name, snapshot_name)
+
+
+def restore_snapshot(save_name: str, snapshot_name: str, new_save_name: str|None = None) -> None:
+    """
+    Restore the snapshot of the save, in place or as a new save.
+    The restored save uses the backend and the chunks encoding of the save when the snapshot was created.
+    When restored in place, the current save is deleted only once the snapshot is restored.
+    """
+    backups_path = get_backups_path(save_name)
+    manifest = load_snapshot(save_name, snapshot_name)
+    target_save_name = save_name if new_save_name is None else new_save_name
+    if new_save_name is not None and os.path.exists(os.path.join(SAVES_PATH, new_save_name)):
+        raise FileExistsError(f'A save named {new_save_name} already exists')
+    # hidden from the saves' catalog until it is restored
+    restoring_save_name = f'.restoring_{target_save_name}'
+    shutil.rmtree(os.path.join(SAVES_PATH, restoring_save_name), ignore_errors=True)
+    save_manager = get_save_manager(restoring_save_name, manifest['backend'], manifest['chunks_encoding'], write_behind=False)
+    try:
+        # saved first, as the DELTA encoding needs the seed of the random access worlds
+        if manifest['generation_infos'] is not None:
+            save_manager.save_generation_infos(manifest['generation_infos'])
+        hashes = list(manifest['chunks'].values())
+        for i in range(0, len(hashes), RESTORE_BATCH_SIZE):
+            save_manager.save_chunks([bytes_to_chunk(_read_object(backups_path, chunk_hash)) for chunk_hash in hashes[i:i + RESTORE_BATCH_SIZE]])
+        for name, player_infos in manifest['players'].items():
+            save_manager._save_player_infos(name, player_infos)
+    finally:
+        save_manager.close()
+    if os.path.exists(os.path.join(SAVES_PATH, target_save_name)):
+        delete_save(target_save_name)
+    os.rename(os.path.join(SAVES_PATH, restoring_save_name), os.path.join(SAVES_PATH, target_save_name))
+    seed = None if manifest['generation_infos'] is None else manifest['generation_infos'].get('seed', None)
+    update_save_metadata(target_save_name, seed, len(hashes), played=False)
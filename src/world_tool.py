@@ -0,0 +1,464 @@
+"""
+Command line tool working on a save (saves/<name>) without starting the game.
+Run python src/world_tool.py --help to see the commands.
+"""
+import os, sys
+
+gui_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gui')
+sys.path.append(gui_path)
+
+# the blocks' images need a display to be loaded, but no window is opened
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+import pygame
+pygame.init()
+pygame.display.set_mode((1, 1))
+
+import argparse
+import multiprocessing
+import signal
+from time import perf_counter
+import blocks
+from typing import Any
+from chunk_serialization import chunk_to_bytes, bytes_to_chunk, RAW, ZLIB, PALETTE, DELTA
+from map_chunk import Chunk
+from map_generation import MapGenerator
+from region_save_manager import RegionFile, REGION_SIZE
+from save_manager import SaveManager, SAVES_PATH
+from save_backends import BACKENDS, NEW_SAVES_BACKEND, get_save_backend, get_save_manager, load_save_infos, convert_save
+from save_catalog import update_save_metadata
+from world_backup import create_snapshot, get_snapshot_names, load_snapshot, remove_snapshot, restore_snapshot
+from sqlite_save_manager import DATABASE_NAME
+
+ENCODINGS: dict[str, int] = {
+    'raw': RAW,
+    'zlib': ZLIB,
+    'palette': PALETTE,
+    'delta': DELTA,
+}
+
+# save manager of each worker process of validate
+_worker_save_manager: SaveManager|None = None
+# map generator of each worker process of pregenerate
+_worker_map_generator: MapGenerator|None = None
+# number of chunks generated by a worker before the chunks are saved, for the sequential generation
+PREGENERATION_BATCH_SIZE = 256
+# generation infos' lists with a value for each direction (left, right)
+DIRECTION_INFOS_KEYS = ('are_last_biomes_forests', 'last_biomes', 'biome_height_values', 'last_block_height_values',
+                        'temperature_values', 'humidity_values', 'last_caves_pos_and_sizes')
+
+
+def open_save(save_name: str) -> SaveManager:
+    if not os.path.isdir(os.path.join(SAVES_PATH, save_name)):
+        raise SystemExit(f'No save named {save_name}')
+    return get_save_manager(save_name, write_behind=False)
+
+
+def check_chunk(save_manager: SaveManager, id: int) -> tuple[int, int|None, float, str|None]:
+    """Load the chunk and return its id, its written size, its loading time (in seconds) and its error (or None if it is valid)"""
+    start = perf_counter()
+    try:
+        chunk = save_manager.load_chunk(id)
+    except Exception as e:
+        return id, save_manager.get_written_chunk_size(id), perf_counter() - start, f'{type(e).__name__}: {e}'
+    duration = perf_counter() - start
+    size = save_manager.get_written_chunk_size(id)
+    if chunk is None:
+        return id, size, duration, 'not found'
+    unknown_ids = set(chunk.get_blocks_ids()).difference(blocks.REVERSED_BLOCKS_DICT)
+    if unknown_ids:
+        return id, size, duration, f'unknown blocks ids: {sorted(unknown_ids)}'
+    return id, size, duration, None
+
+
+def _init_worker_signals() -> None:
+    # SDL replaces the handler of SIGTERM, used to stop the workers, and Ctrl+C is handled by the main process
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _init_worker(save_name: str) -> None:
+    global _worker_save_manager
+    _init_worker_signals()
+    _worker_save_manager = get_save_manager(save_name, write_behind=False)
+
+
+def _check_chunk_in_worker(id: int) -> tuple[int, int|None, float, str|None]:
+    return check_chunk(_worker_save_manager, id)
+
+
+def _init_generation_worker(seed: str) -> None:
+    global _worker_map_generator
+    _init_worker_signals()
+    _worker_map_generator = MapGenerator(seed, True)
+
+
+def _generate_chunk_in_worker(id: int) -> tuple[bytes, dict[str, Any]]:
+    """Generate the chunk with the random access generation, and return it as RAW data (chunks can't be sent to the main process) and its generation state"""
+    chunk = _worker_map_generator.generate_chunk(id >= 0, id)
+    return chunk_to_bytes(chunk, RAW), chunk.generation_state
+
+
+def _generate_chunks_in_direction(generation_infos: dict[str, Any], direction: bool, ids: list[int]) -> tuple[list[tuple[bytes, dict[str, Any]]], dict[str, Any]]:
+    """Generate the chunks in order with the sequential generation, and return them with the generation infos after the last one"""
+    map_generator = MapGenerator()
+    map_generator.set_infos(generation_infos)
+    results = []
+    for id in ids:
+        chunk = map_generator.generate_chunk(direction, id)
+        results.append((chunk_to_bytes(chunk, RAW), chunk.generation_state))
+    return results, map_generator.get_infos_to_save()
+
+
+def _decode_generated_chunks(results: list[tuple[bytes, dict[str, Any]]]) -> list[Chunk]:
+    chunks = []
+    for data, generation_state in results:
+        chunk = bytes_to_chunk(data)
+        chunk.generation_state = generation_state
+        chunks.append(chunk)
+    return chunks
+
+
+class PregenerationProgress:
+    def __init__(self, nb_chunks: int) -> None:
+        self.nb_chunks: int = nb_chunks
+        self.nb_generated_chunks: int = 0
+        self.start: float = perf_counter()
+        self._last_report: float = self.start
+
+    def add(self, nb_chunks: int) -> None:
+        self.nb_generated_chunks += nb_chunks
+        if perf_counter() - self._last_report > 1 or self.nb_generated_chunks == self.nb_chunks:
+            self._last_report = perf_counter()
+            print(f'{self.nb_generated_chunks}/{self.nb_chunks} chunks, {self.get_speed():.0f} chunks/s', flush=True)
+
+    def get_speed(self) -> float:
+        return self.nb_generated_chunks / max(perf_counter() - self.start, 1e-9)
+
+
+def pregenerate_random_access(save_manager: SaveManager, seed: str, ids: list[int], workers: int) -> None:
+    """Generate the chunks in any order on the worker processes, and save them together"""
+    progress = PregenerationProgress(len(ids))
+    with multiprocessing.Pool(workers, _init_generation_worker, (seed,)) as pool:
+        results = []
+        for result in pool.imap_unordered(_generate_chunk_in_worker, ids, chunksize=16):
+            results.append(result)
+            if len(results) < PREGENERATION_BATCH_SIZE: continue
+            save_manager.save_chunks(_decode_generated_chunks(results))
+            progress.add(len(results))
+            results = []
+        save_manager.save_chunks(_decode_generated_chunks(results))
+        progress.add(len(results))
+
+
+def pregenerate_sequential(save_manager: SaveManager, generation_infos: dict[str, Any], ids_by_direction: dict[bool, list[int]]) -> None:
+    """
+    Generate each direction in order in its own worker process, by batches.
+    After each batch, the chunks are saved, then the generation infos with the next ids to generate (so it can be resumed from there).
+    """
+    progress = PregenerationProgress(sum(len(ids) for ids in ids_by_direction.values()))
+    with multiprocessing.Pool(2, _init_worker_signals) as pool:
+        tasks = {}
+        for direction, ids in ids_by_direction.items():
+            if ids:
+                tasks[direction] = pool.apply_async(_generate_chunks_in_direction, (generation_infos, direction, ids[:PREGENERATION_BATCH_SIZE]))
+        while tasks:
+            for direction in list(tasks):
+                results, direction_infos = tasks.pop(direction).get()
+                save_manager.save_chunks(_decode_generated_chunks(results))
+                progress.add(len(results))
+                ids = ids_by_direction[direction] = ids_by_direction[direction][len(results):]
+                for key in DIRECTION_INFOS_KEYS:
+                    generation_infos[key][direction] = direction_infos[key][direction]
+                generation_infos['next_chunk_ids'][direction] += len(results) if direction else -len(results)
+                save_manager.save_generation_infos(generation_infos)
+                if ids:
+                    tasks[direction] = pool.apply_async(_generate_chunks_in_direction, (generation_infos, direction, ids[:PREGENERATION_BATCH_SIZE]))
+
+
+def pregenerate(args: argparse.Namespace) -> None:
+    save_path = os.path.join(SAVES_PATH, args.save)
+    if os.path.isdir(save_path):
+        save_manager = get_save_manager(args.save)
+        generation_infos = save_manager.load_generation_infos()
+    else:
+        save_manager = get_save_manager(args.save, args.backend or NEW_SAVES_BACKEND)
+        generation_infos = None
+    try:
+        if generation_infos is None:
+            map_generator = MapGenerator(args.seed, True)
+            map_generator.create_seeds()
+            generation_infos = map_generator.get_infos_to_save()
+            save_manager.save_generation_infos(generation_infos)
+        elif args.seed is not None and args.seed != generation_infos['seed']:
+            raise SystemExit(f'The save {args.save} has the seed {generation_infos["seed"]}')
+        seed = generation_infos['seed']
+        saved_ids = save_manager.get_chunk_ids()
+        start = perf_counter()
+        if generation_infos.get('random_access', False):
+            ids = [id for id in sorted(range(args.start, args.end), key=abs) if id not in saved_ids]
+            nb_chunks = len(ids)
+            print(f'{nb_chunks} chunks to generate (random access generation, {args.workers} workers)')
+            pregenerate_random_access(save_manager, seed, ids, args.workers)
+        else:
+            # the chunks must be generated in order from the chunk 0, from where the previous generation stopped
+            if 0 not in saved_ids:
+                map_generator = MapGenerator()
+                map_generator.set_infos(generation_infos)
+                # generated to the left, like the first chunk of the game
+                save_manager.save_chunks([map_generator.generate_chunk(False, 0)])
+                generation_infos = map_generator.get_infos_to_save()
+                saved_ids.add(0)
+            next_ids = generation_infos.get('next_chunk_ids', None)
+            if next_ids is None:
+                next_ids = [min(saved_ids) - 1, max(saved_ids) + 1]
+            generation_infos['next_chunk_ids'] = next_ids
+            save_manager.save_generation_infos(generation_infos)
+            ids_by_direction = {False: list(range(next_ids[False], args.start - 1, -1)), True: list(range(next_ids[True], args.end))}
+            nb_chunks = len(ids_by_direction[False]) + len(ids_by_direction[True])
+            print(f'{nb_chunks} chunks to generate (sequential generation, a worker by direction)')
+            pregenerate_sequential(save_manager, generation_infos, ids_by_direction)
+        duration = perf_counter() - start
+        nb_saved_chunks = len(save_manager.get_chunk_ids())
+    except KeyboardInterrupt:
+        raise SystemExit('Interrupted, the saved chunks are kept: run the same command again to resume')
+    finally:
+        save_manager.close()
+    update_save_metadata(args.save, seed, nb_saved_chunks, played=False)
+    if nb_chunks:
+        print(f'{nb_chunks} chunks generated in {duration:.2f}s ({nb_chunks / duration:.0f} chunks/s)')
+
+
+def count_chunks_encodings(save_manager: SaveManager) -> dict[str, int]:
+    """Count the chunks by the encoding they are written with, 'json' being the chunks saved by the versions before the binary chunks"""
+    names = {value: name for name, value in ENCODINGS.items()}
+    counts: dict[str, int] = {}
+    for id in save_manager.get_chunk_ids():
+        encoding = save_manager.get_written_chunk_encoding(id)
+        name = 'json' if encoding is None else names.get(encoding, str(encoding))
+        counts[name] = counts.get(name, 0) + 1
+    return counts
+
+
+def format_chunks_encodings(counts: dict[str, int]) -> str:
+    return ', '.join(f'{name}: {count}' for name, count in sorted(counts.items(), key=lambda item: -item[1])) or 'none'
+
+
+def info(args: argparse.Namespace) -> None:
+    save_manager = open_save(args.save)
+    try:
+        ids = save_manager.get_chunk_ids()
+        sizes = [save_manager.get_written_chunk_size(id) or 0 for id in ids]
+        encoding = next(name for name, value in ENCODINGS.items() if value == save_manager.chunks_encoding)
+        print(f'backend: {get_save_backend(args.save)}')
+        print(f'chunks encoding: {encoding} (used to write the chunks)')
+        print(f'written chunks encodings: {format_chunks_encodings(count_chunks_encodings(save_manager))}')
+        print(f'chunks: {len(ids)}')
+        print(f'chunks size: {sum(sizes)} bytes')
+        print(f'edits in the journal: {sum(len(edits) for edits in save_manager.journal.edits.values())}')
+    finally:
+        save_manager.close()
+
+
+def convert(args: argparse.Namespace) -> None:
+    """Report the chunks written with another encoding than the asked one, like the DELTA chunks which can't be generated again"""
+    start = perf_counter()
+    backend = get_save_backend(args.save) if args.backend is None else args.backend
+    chunks_encoding = None if args.encoding is None else ENCODINGS[args.encoding]
+    if chunks_encoding is None and backend == get_save_backend(args.save):
+        # keep the chunks encoding of the save
+        chunks_encoding = load_save_infos(args.save).get('chunks_encoding', None)
+    convert_save(args.save, backend, chunks_encoding)
+    save_manager = open_save(args.save)
+    try:
+        nb_chunks = len(save_manager.get_chunk_ids())
+        encoding = next(name for name, value in ENCODINGS.items() if value == save_manager.chunks_encoding)
+        counts = count_chunks_encodings(save_manager)
+    finally:
+        save_manager.close()
+    update_save_metadata(args.save, nb_chunks=nb_chunks, played=False)
+    duration = perf_counter() - start
+    print(f'{nb_chunks} chunks converted in {duration:.2f}s ({nb_chunks / duration:.0f} chunks/s)')
+    other_counts = {name: count for name, count in counts.items() if name != encoding}
+    if other_counts:
+        print(f'{sum(other_counts.values())} chunks fell back to another encoding than {encoding} ({format_chunks_encodings(other_counts)})')
+
+
+def get_orphan_files(save_name: str) -> list[str]:
+    """Return the chunks files which aren't used by the backend of the save"""
+    backend = get_save_backend(save_name)
+    save_path = os.path.join(SAVES_PATH, save_name)
+    chunks_path = os.path.join(save_path, 'chunks')
+    chunks_files = os.listdir(chunks_path) if os.path.isdir(chunks_path) else []
+    orphan_files = [file for file in chunks_files if file.endswith('.tmp')]
+    if backend == 'sqlite':
+        orphan_files = chunks_files
+    else:
+        orphan_files += [file for file in chunks_files if file.endswith('.region') and backend != 'regions']
+        # chunks files hidden by a more recent version of the chunk
+        chunks_files_ids: set[int] = {int(file.removesuffix('.chunk')) for file in chunks_files if file.endswith('.chunk')}
+        regions_ids: set[int] = set()
+        if backend == 'regions':
+            for file in chunks_files:
+                if not file.endswith('.region'): continue
+                region_file = RegionFile(os.path.join(chunks_path, file))
+                region_id = int(file.removesuffix('.region'))
+                regions_ids.update(region_id * REGION_SIZE + index for index in region_file.get_indexes())
+                region_file.close()
+            orphan_files += [file for file in chunks_files if file.endswith('.chunk') and int(file.removesuffix('.chunk')) in regions_ids]
+        orphan_files += [file for file in chunks_files if file.endswith('.json') and int(file.removesuffix('.json')) in chunks_files_ids | regions_ids]
+    orphan_files = [os.path.join(chunks_path, file) for file in orphan_files]
+    if backend != 'sqlite':
+        orphan_files += [os.path.join(save_path, file) for file in os.listdir(save_path) if file.startswith(DATABASE_NAME)]
+    return orphan_files
+
+
+def clean(args: argparse.Namespace) -> None:
+    if not os.path.isdir(os.path.join(SAVES_PATH, args.save)):
+        raise SystemExit(f'No save named {args.save}')
+    freed_size = 0
+    orphan_files = get_orphan_files(args.save)
+    for path in orphan_files:
+        freed_size += os.path.getsize(path)
+        if args.verbose or args.dry_run:
+            print(path)
+        if not args.dry_run:
+            os.remove(path)
+    if not args.dry_run:
+        update_save_metadata(args.save, played=False)
+    print(f'{len(orphan_files)} orphan files, {freed_size} bytes{" (not removed)" if args.dry_run else " removed"}')
+
+
+def validate(args: argparse.Namespace) -> None:
+    # also cleans the journal before the workers read it
+    save_manager = open_save(args.save)
+    ids = sorted(save_manager.get_chunk_ids())
+    nb_invalid_chunks = 0
+    total_size = 0
+    total_duration = 0
+    max_duration = 0
+    start = perf_counter()
+    pool = None
+    try:
+        if args.workers > 1:
+            pool = multiprocessing.Pool(args.workers, _init_worker, (args.save,))
+            results = pool.imap(_check_chunk_in_worker, ids, chunksize=64)
+        else:
+            results = (check_chunk(save_manager, id) for id in ids)
+        for id, size, duration, error in results:
+            total_size += size or 0
+            total_duration += duration
+            max_duration = max(max_duration, duration)
+            if error is not None:
+                nb_invalid_chunks += 1
+            if args.verbose or error is not None:
+                print(f'chunk {id}: {size} bytes, {duration * 1000:.2f}ms{"" if error is None else ", " + error}')
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        save_manager.close()
+    duration = perf_counter() - start
+    nb_chunks = len(ids)
+    print(f'{nb_chunks} chunks, {nb_invalid_chunks} invalid, {total_size} bytes')
+    if nb_chunks:
+        print(f'mean size: {total_size / nb_chunks:.0f} bytes, mean loading time: {total_duration / nb_chunks * 1000:.2f}ms, max loading time: {max_duration * 1000:.2f}ms')
+        print(f'{duration:.2f}s ({nb_chunks / duration:.0f} chunks/s)')
+    if nb_invalid_chunks:
+        sys.exit(1)
+
+
+def backup(args: argparse.Namespace) -> None:
+    start = perf_counter()
+    save_manager = open_save(args.save)
+    try:
+        manifest = create_snapshot(save_manager)
+    finally:
+        save_manager.close()
+    print(f'snapshot {manifest["name"]}: {len(manifest["chunks"])} chunks, {manifest["nb_new_chunks"]} new ({manifest["new_size"]} bytes) in {perf_counter() - start:.2f}s')
+
+
+def snapshots(args: argparse.Namespace) -> None:
+    for snapshot_name in get_snapshot_names(args.save):
+        manifest = load_snapshot(args.save, snapshot_name)
+        print(f'{snapshot_name}: {len(manifest["chunks"])} chunks, {manifest["nb_new_chunks"]} new ({manifest["new_size"]} bytes)')
+
+
+def restore(args: argparse.Namespace) -> None:
+    if args.snapshot not in get_snapshot_names(args.save):
+        raise SystemExit(f'No snapshot named {args.snapshot} for the save {args.save}')
+    start = perf_counter()
+    restore_snapshot(args.save, args.snapshot, args.new_save)
+    print(f'snapshot {args.snapshot} restored as {args.new_save or args.save} in {perf_counter() - start:.2f}s')
+
+
+def remove_backup(args: argparse.Namespace) -> None:
+    if args.snapshot not in get_snapshot_names(args.save):
+        raise SystemExit(f'No snapshot named {args.snapshot} for the save {args.save}')
+    remove_snapshot(args.save, args.snapshot)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Work on a save without starting the game')
+    subparsers = parser.add_subparsers(required=True)
+
+    info_parser = subparsers.add_parser('info', help='show the backend, the chunks encoding and the size of the save')
+    info_parser.add_argument('save')
+    info_parser.set_defaults(function=info)
+
+    convert_parser = subparsers.add_parser('convert', help='convert the save to another backend and/or chunks encoding')
+    convert_parser.add_argument('save')
+    convert_parser.add_argument('--backend', choices=BACKENDS)
+    convert_parser.add_argument('--encoding', choices=ENCODINGS)
+    convert_parser.set_defaults(function=convert)
+
+    recompress_parser = subparsers.add_parser('recompress', help='rewrite every chunk with the given encoding')
+    recompress_parser.add_argument('save')
+    recompress_parser.add_argument('encoding', choices=ENCODINGS)
+    recompress_parser.set_defaults(function=convert, backend=None)
+
+    clean_parser = subparsers.add_parser('clean', help='remove the chunks files not used by the backend of the save')
+    clean_parser.add_argument('save')
+    clean_parser.add_argument('--dry-run', action='store_true', help='only list the files')
+    clean_parser.add_argument('-v', '--verbose', action='store_true')
+    clean_parser.set_defaults(function=clean)
+
+    validate_parser = subparsers.add_parser('validate', help='load every chunk, checking its blocks ids and its generation, and report sizes and loading times')
+    validate_parser.add_argument('save')
+    validate_parser.add_argument('-j', '--workers', type=int, default=1, help='number of worker processes')
+    validate_parser.add_argument('-v', '--verbose', action='store_true', help='report every chunk')
+    validate_parser.set_defaults(function=validate)
+
+    pregenerate_parser = subparsers.add_parser('pregenerate', help='generate and save the chunks of the range, creating the save if needed; run it again to resume it')
+    pregenerate_parser.add_argument('save')
+    pregenerate_parser.add_argument('start', type=int, help='first chunk id')
+    pregenerate_parser.add_argument('end', type=int, help='chunk id after the last one')
+    pregenerate_parser.add_argument('--seed', help='seed of the new save')
+    pregenerate_parser.add_argument('--backend', choices=BACKENDS, help='backend of the new save')
+    pregenerate_parser.add_argument('-j', '--workers', type=int, default=multiprocessing.cpu_count(), help='number of worker processes for the random access generation')
+    pregenerate_parser.set_defaults(function=pregenerate)
+
+    backup_parser = subparsers.add_parser('backup', help='create a snapshot of the save, only copying the chunks which changed since the previous ones')
+    backup_parser.add_argument('save')
+    backup_parser.set_defaults(function=backup)
+
+    snapshots_parser = subparsers.add_parser('snapshots', help='list the snapshots of the save')
+    snapshots_parser.add_argument('save')
+    snapshots_parser.set_defaults(function=snapshots)
+
+    restore_parser = subparsers.add_parser('restore', help='restore a snapshot of the save')
+    restore_parser.add_argument('save')
+    restore_parser.add_argument('snapshot')
+    restore_parser.add_argument('--as', dest='new_save', help='restore the snapshot as a new save instead of replacing the save')
+    restore_parser.set_defaults(function=restore)
+
+    remove_backup_parser = subparsers.add_parser('remove-backup', help='remove a snapshot of the save, and the chunks only used by it')
+    remove_backup_parser.add_argument('save')
+    remove_backup_parser.add_argument('snapshot')
+    remove_backup_parser.set_defaults(function=remove_backup)
+
+    args = parser.parse_args()
+    args.function(args)
+
+
+if __name__ == '__main__':
+    main()